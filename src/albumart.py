@@ -55,12 +55,13 @@ class AlbumArt:
     def get_path(self, album_id, size):
         path = None
         try:
-            path = self._get_cache_path(album_id)
+            record = Objects.albums.get_record(album_id)
+            path = self._get_cache_path(record)
             CACHE_PATH_JPG = "%s/%s_%s.jpg" % (self._CACHE_PATH, path, size)
             if os.path.exists(CACHE_PATH_JPG):
                 return CACHE_PATH_JPG
             else:
-                self.get(album_id, size)
+                self.get(album_id, size, record)
                 if os.path.exists(CACHE_PATH_JPG):
                     return CACHE_PATH_JPG
                 else:
@@ -79,40 +80,21 @@ class AlbumArt:
         @return cover file path as string
     """
     def get_art_path(self, album_id, sql=None):
-        album_path = Objects.albums.get_path(album_id, sql)
-        album_name = Objects.albums.get_name(album_id, sql)
-        artist_name = Objects.albums.get_artist_name(album_id, sql)
-        try:
-            if os.path.exists(album_path + "/" + self._favorite):
-                return album_path + "/" + self._favorite
-            # Used when having muliple albums in same folder
-            elif os.path.exists(album_path + "/" + artist_name +
-                                "_" + album_name + ".jpg"):
-                return album_path + "/" +\
-                       artist_name + "_" + album_name + ".jpg"
-
-            for file in os.listdir(album_path):
-                lowername = file.lower()
-                supported = False
-                for mime in self._mimes:
-                    if lowername.endswith(mime):
-                        supported = True
-                        break
-                if (supported):
-                    return "%s/%s" % (album_path, file)
-
-            return None
-        except Exception as e:
-            print("AlbumArt::get_art_path(): %s" % e)
+        return self._get_art_path(Objects.albums.get_record(album_id, sql))
 
     """
         Return pixbuf for album_id, covers are cached as jpg.
         @param album id as int, pixbuf size as int
+        @param record as AlbumRecord, read from db if None
         return: pixbuf
     """
-    def get(self, album_id, size):
-        path = self._get_cache_path(album_id)
+    def get(self, album_id, size, record=None):
+        if record is None:
+            record = Objects.albums.get_record(album_id)
+        path = self._get_cache_path(record)
         CACHE_PATH_JPG = "%s/%s_%s.jpg" % (self._CACHE_PATH, path, size)
+        # Cover extracted from tags, at its original size
+        TAGS_PATH_JPG = "%s/%s_tags.jpg" % (self._CACHE_PATH, path)
         pixbuf = None
 
         try:
@@ -122,19 +104,27 @@ class AlbumArt:
                                                                 size,
                                                                 size)
             else:
-                path = self.get_art_path(album_id)
+                path = self._get_art_path(record)
                 # Look in album folder
                 if path:
                     pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(path,
                                                                      size,
                                                                      size,
                                                                      False)
+                # Cover already extracted from tags
+                elif os.path.exists(TAGS_PATH_JPG):
+                    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                                                                TAGS_PATH_JPG,
+                                                                size,
+                                                                size,
+                                                                False)
                 # Try to get from tags
                 else:
                     try:
                         for track_id in Objects.albums.get_tracks(album_id,
                                                                   None):
-                            pixbuf = self._pixbuf_from_tags(track_id, size)
+                            pixbuf = self._pixbuf_from_tags(track_id, size,
+                                                            TAGS_PATH_JPG)
                             # We found a cover in tags
                             if pixbuf:
                                 break
@@ -169,7 +159,7 @@ class AlbumArt:
         @param album id as int
     """
     def clean_cache(self, album_id):
-        path = self._get_cache_path(album_id)
+        path = self._get_cache_path(Objects.albums.get_record(album_id))
         for f in os.listdir(self._CACHE_PATH):
             if re.search('%s_.*\.jpg' % path, f):
                 os.remove(os.path.join(self._CACHE_PATH, f))
@@ -180,10 +170,11 @@ class AlbumArt:
         @param album id as int
     """
     def save_art(self, pixbuf, album_id):
-        album_path = Objects.albums.get_path(album_id)
+        record = Objects.albums.get_record(album_id)
+        album_path = record.path
         path_count = Objects.albums.get_path_count(album_path)
-        album_name = Objects.albums.get_name(album_id)
-        artist_name = Objects.albums.get_artist_name(album_id)
+        album_name = record.name
+        artist_name = record.artist_name
         try:
             # Many albums with same path, suffix with artist_album name
             if path_count > 1:
@@ -233,13 +224,18 @@ class AlbumArt:
 # PRIVATE             #
 #######################
     """
-        Return cover from tags
+        Return cover from tags, save it to path so the file
+        is not decoded again for other sizes
         @param track id as int
         @param size as int
+        @param path as string
     """
-    def _pixbuf_from_tags(self, track_id, size):
+    def _pixbuf_from_tags(self, track_id, size, path):
         pixbuf = None
         filepath = Objects.tracks.get_path(track_id)
+        # Do not read files known to have no cover
+        if Objects.tagcache.has_art(filepath) is False:
+            return None
         infos = Objects.player.get_infos(filepath)
         exist = False
         if infos is not None:
@@ -247,6 +243,11 @@ class AlbumArt:
         if exist:
             (exist, mapflags) = sample.get_buffer().map(Gst.MapFlags.READ)
         if exist:
+            try:
+                with open(path, "wb") as f:
+                    f.write(mapflags.data)
+            except Exception as e:
+                print("AlbumArt::_pixbuf_from_tags(): %s" % e)
             stream = Gio.MemoryInputStream.new_from_data(mapflags.data,
                                                          None)
             pixbuf = GdkPixbuf.Pixbuf.new_from_stream_at_scale(stream,
@@ -256,13 +257,44 @@ class AlbumArt:
                                                                None)
         return pixbuf
 
+    """
+        Look for covers in album dir, see get_art_path()
+        @param record as AlbumRecord
+        @return cover file path as string
+    """
+    def _get_art_path(self, record):
+        album_path = record.path
+        album_name = record.name
+        artist_name = record.artist_name
+        try:
+            if os.path.exists(album_path + "/" + self._favorite):
+                return album_path + "/" + self._favorite
+            # Used when having muliple albums in same folder
+            elif os.path.exists(album_path + "/" + artist_name +
+                                "_" + album_name + ".jpg"):
+                return album_path + "/" +\
+                       artist_name + "_" + album_name + ".jpg"
+
+            for file in os.listdir(album_path):
+                lowername = file.lower()
+                supported = False
+                for mime in self._mimes:
+                    if lowername.endswith(mime):
+                        supported = True
+                        break
+                if (supported):
+                    return "%s/%s" % (album_path, file)
+
+            return None
+        except Exception as e:
+            print("AlbumArt::_get_art_path(): %s" % e)
+
     """
         Get a uniq string for album
-        @param album id as int
+        @param record as AlbumRecord
     """
-    def _get_cache_path(self, album_id):
-        path = Objects.albums.get_name(album_id) + "_" + \
-               Objects.albums.get_artist_name(album_id)
+    def _get_cache_path(self, record):
+        path = record.name + "_" + record.artist_name
         return path[0:240].replace("/", "_")
 
     """
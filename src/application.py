@@ -18,7 +18,9 @@ from lollypop.utils import is_audio
 from lollypop.define import Objects, ArtSize
 from lollypop.window import Window
 from lollypop.database import Database
+from lollypop.tagcache import TagCache
 from lollypop.player import Player
+from lollypop.playstats import PlayStats
 from lollypop.albumart import AlbumArt
 from lollypop.settings import SettingsDialog
 from lollypop.mpris import MPRIS
@@ -27,6 +29,7 @@ from lollypop.database_albums import DatabaseAlbums
 from lollypop.database_artists import DatabaseArtists
 from lollypop.database_genres import DatabaseGenres
 from lollypop.database_tracks import DatabaseTracks
+from lollypop.database_search import DatabaseSearch
 from lollypop.playlists import PlaylistsManager
 from lollypop.fullscreen import FullScreen
 
@@ -64,11 +67,14 @@ class Application(Gtk.Application):
         Objects.db = Database()
         # We store a cursor for the main thread
         Objects.sql = Objects.db.get_cursor()
+        Objects.playstats = PlayStats()
+        Objects.tagcache = TagCache()
         Objects.player = Player()
         Objects.albums = DatabaseAlbums()
         Objects.artists = DatabaseArtists()
         Objects.genres = DatabaseGenres()
         Objects.tracks = DatabaseTracks()
+        Objects.search = DatabaseSearch()
         Objects.playlists = PlaylistsManager()
         Objects.art = AlbumArt()
 
@@ -135,6 +141,7 @@ class Application(Gtk.Application):
             # this will delete orphaned albums
             Objects.settings.set_value('force-scan', GLib.Variant('b', True))
             Objects.tracks.remove_tmp()
+        Objects.playstats.flush()
         try:
             Objects.sql.execute("VACUUM")
         except:
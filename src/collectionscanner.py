@@ -13,12 +13,14 @@
 
 import os
 from time import sleep
+from queue import Queue
 from gettext import gettext as _
 from gi.repository import GLib, GObject, Gio
 from _thread import start_new_thread
 
 from lollypop.define import Objects, Navigation
 from lollypop.utils import format_artist_name, is_audio
+from lollypop.tagreader import TagReader
 
 
 class CollectionScanner(GObject.GObject):
@@ -26,9 +28,14 @@ class CollectionScanner(GObject.GObject):
         'scan-finished': (GObject.SignalFlags.RUN_FIRST, None, ()),
         'artist-update': (GObject.SignalFlags.RUN_FIRST, None, (int, int)),
         'genre-update': (GObject.SignalFlags.RUN_FIRST, None, (int,)),
-        'add-finished': (GObject.SignalFlags.RUN_FIRST, None, ())
+        'add-finished': (GObject.SignalFlags.RUN_FIRST, None, ()),
+        'paths-updated': (GObject.SignalFlags.RUN_FIRST, None,
+                          (GObject.TYPE_PYOBJECT,))
     }
 
+    # Tracks written to db between two commits while scanning
+    BATCH_SIZE = 1000
+
     """
         @param progress as Gtk.Progress
     """
@@ -38,60 +45,88 @@ class CollectionScanner(GObject.GObject):
         self._progress = progress
         self._in_thread = False
         self._smooth = False
+        self._full = False
+        self._by_extension = True
         self._added = []
+        # Files to add when running scan finishes
+        self._to_add = []
+        # Albums needing a year update
+        self._touched_albums = set()
+        # Ids of removed tracks, may be orphaned
+        self._removed_albums = set()
+        self._removed_artists = set()
+        self._removed_genres = set()
+        # Notifications waiting for next commit
+        self._new_genres = []
+        self._new_artists = []
 
     """
         Update database
         @param smooth as bool, if smooth, try to scan smoothly
+        @param full as bool, if not full, only scan modified directories
     """
-    def update(self, smooth):
+    def update(self, smooth, full=False):
         self._smooth = smooth
-        paths = Objects.settings.get_value('music-path')
+        self._full = full
+        paths = self.get_paths()
         if not paths:
-            if GLib.get_user_special_dir(GLib.UserDirectory.DIRECTORY_MUSIC):
-                paths = [GLib.get_user_special_dir(
-                                          GLib.UserDirectory.DIRECTORY_MUSIC)]
-            else:
-                print("You need to add a music path"
-                      " to org.gnome.Lollypop in dconf")
-                return
+            print("You need to add a music path"
+                  " to org.gnome.Lollypop in dconf")
+            return
 
         if not self._in_thread:
             self._progress.show()
             self._in_thread = True
             self._compilations = []
+            self._by_extension = Objects.settings.get_value(
+                                                   'audio-by-extension')
             self._mtimes = Objects.tracks.get_mtimes()
             start_new_thread(self._scan, (paths,))
 
     """
-        Add specified files to collection
+        Update database for paths, files or directories, added,
+        modified or removed
+        Emit "paths-updated" with directories found in paths when done
+        @param paths as [string]
+        @return False if a scan is already running
+    """
+    def update_paths(self, paths):
+        if self._in_thread:
+            return False
+        self._in_thread = True
+        self._by_extension = Objects.settings.get_value('audio-by-extension')
+        start_new_thread(self._update_paths, (paths,))
+        return True
+
+    """
+        Return music paths
+        @return [string]
+    """
+    def get_paths(self):
+        paths = Objects.settings.get_value('music-path')
+        if not paths:
+            if GLib.get_user_special_dir(GLib.UserDirectory.DIRECTORY_MUSIC):
+                paths = [GLib.get_user_special_dir(
+                                          GLib.UserDirectory.DIRECTORY_MUSIC)]
+            else:
+                paths = []
+        return list(paths)
+
+    """
+        Add specified files to collection, after running scan if any
+        Emit "add-finished" when done
         @param files as [Gio.Files]
-        @thread safe
     """
     def add(self, files):
         if not files:
             return
-        GLib.idle_add(self._progress.show)
-        sql = Objects.db.get_cursor()
-        tracks = Objects.tracks.get_paths(sql)
-        count = len(files)
-        i = 0
-        GLib.idle_add(self._update_progress, i, count)
-        self._added = []
-        for f in files:
-            if f not in tracks:
-                infos = Objects.player.get_infos(f)
-                if infos is not None:
-                    self._added.append(self._add2db(f, 0, infos, sql))
-            else:
-                self._added.append(Objects.tracks.get_id_by_path(f, sql))
-            i += 1
-            GLib.idle_add(self._update_progress, i, count)
-        Objects.albums.sanitize(sql)
-        sql.commit()
-        sql.close()
-        GLib.idle_add(self._progress.hide)
-        GLib.idle_add(self.emit, "add-finished")
+        # Scan state is shared, wait for running one
+        if self._in_thread:
+            self._to_add += files
+            return
+        self._in_thread = True
+        self._progress.show()
+        start_new_thread(self._add, (files,))
 
     """
         Return files added by last call to CollectionScanner::add
@@ -104,6 +139,35 @@ class CollectionScanner(GObject.GObject):
 # PRIVATE             #
 #######################
 
+    """
+        Add files to collection
+        @param files as [Gio.Files]
+    """
+    def _add(self, files):
+        sql = Objects.db.get_cursor()
+        self._load_caches(sql)
+        try:
+            tracks = set(Objects.tracks.get_paths(sql))
+            count = len(files)
+            i = 0
+            GLib.idle_add(self._update_progress, i, count)
+            self._added = []
+            tagreader = TagReader()
+            for f in files:
+                if f not in tracks:
+                    tags = self._read_tags(tagreader, f)
+                    if tags is not None:
+                        self._added.append(self._add2db(f, 0, tags, sql))
+                else:
+                    self._added.append(Objects.tracks.get_id_by_path(f, sql))
+                i += 1
+                GLib.idle_add(self._update_progress, i, count)
+            self._clean(sql)
+            self._commit(sql)
+        finally:
+            self._clear_caches()
+            GLib.idle_add(self._finish_add)
+
     """
         Update progress bar status
         @param scanned items as int, total items as int
@@ -118,6 +182,33 @@ class CollectionScanner(GObject.GObject):
         self._in_thread = False
         self._progress.hide()
         self.emit("scan-finished")
+        self._add_pending()
+
+    """
+        Notify from main thread when paths update finished
+        @param dirs as [string], directories found in updated paths
+    """
+    def _finish_update(self, dirs):
+        self._in_thread = False
+        self.emit("paths-updated", dirs)
+        self._add_pending()
+
+    """
+        Notify from main thread when add finished
+    """
+    def _finish_add(self):
+        self._in_thread = False
+        self._progress.hide()
+        self.emit("add-finished")
+        self._add_pending()
+
+    """
+        Add files waiting for a scan to finish
+    """
+    def _add_pending(self):
+        files = self._to_add
+        self._to_add = []
+        self.add(files)
 
     """
         Clean track's compilation if needed
@@ -135,216 +226,542 @@ class CollectionScanner(GObject.GObject):
             path = os.path.dirname(filepath)
             Objects.albums.set_path(album_id, path, sql)
 
+    """
+        Load artists/genres/albums ids caches, we are the only writer
+        Caches are only used with sql, clear them with _clear_caches()
+        @param sql as sqlite cursor
+    """
+    def _load_caches(self, sql):
+        Objects.artists.load_cache(sql)
+        Objects.genres.load_cache(sql)
+        Objects.albums.load_cache(sql)
+
+    """
+        Clear ids caches
+    """
+    def _clear_caches(self):
+        Objects.artists.clear_cache()
+        Objects.genres.clear_cache()
+        Objects.albums.clear_cache()
+
+    """
+        Remove tracks from db and clean their albums compilation status
+        @param filepaths as [string]
+        @param sql as sqlite cursor
+        @warning: commit needed
+    """
+    def _remove_tracks(self, filepaths, sql):
+        (album_ids, artist_ids, genre_ids) = Objects.tracks.remove_many(
+                                                                 filepaths,
+                                                                 sql)
+        for album_id in album_ids:
+            self._clean_compilation(album_id, sql)
+        self._removed_albums |= album_ids
+        self._removed_artists |= artist_ids
+        self._removed_genres |= genre_ids
+
+    """
+        Update years of touched albums, delete orphaned entries
+        and update search index
+        @param sql as sqlite cursor
+        @param full as bool, check whole collection for orphans
+        @warning: commit needed
+    """
+    def _clean(self, sql, full=False):
+        Objects.albums.set_years_from_tracks(self._touched_albums, sql)
+        if full:
+            Objects.tracks.clean(sql)
+            Objects.albums.sanitize(sql)
+            Objects.search.rebuild(sql)
+        else:
+            Objects.tracks.clean_ids(self._removed_albums,
+                                     self._removed_artists,
+                                     self._removed_genres,
+                                     sql)
+            merged = Objects.albums.sanitize_ids(self._touched_albums, sql)
+            Objects.search.update(self._touched_albums |
+                                  self._removed_albums |
+                                  merged, sql)
+        self._touched_albums = set()
+        self._removed_albums = set()
+        self._removed_artists = set()
+        self._removed_genres = set()
+
+    """
+        Update database for paths
+        Directories mtimes are updated, so next scan skips them
+        @param paths as [string]
+    """
+    def _update_paths(self, paths):
+        sql = Objects.db.get_cursor()
+        tags_sql = Objects.tagcache.get_cursor()
+        self._load_caches(sql)
+        # Directories found in paths
+        new_dirs = []
+        try:
+            to_discover = []
+            # Removed files or directories
+            removed = []
+            dir_mtimes = {}
+            # Directories with files not read, see _scan()
+            failed = set()
+            for path in paths:
+                try:
+                    # Removed file or directory
+                    if not os.path.exists(path):
+                        filepaths = Objects.tracks.get_paths_in(path, sql)
+                        self._remove_tracks(filepaths, sql)
+                        Objects.tagcache.remove_many(filepaths, tags_sql)
+                        removed.append(path)
+                        parent = os.path.dirname(path)
+                        if os.path.isdir(parent):
+                            dir_mtimes[parent] = os.stat(parent).st_mtime_ns
+                        continue
+
+                    if os.path.isdir(path):
+                        files = []
+                        for root, dirs, names in os.walk(path):
+                            new_dirs.append(root)
+                            dir_mtimes[root] = os.stat(root).st_mtime_ns
+                            for name in names:
+                                files.append(os.path.join(root, name))
+                    else:
+                        files = [path]
+                    parent = os.path.dirname(path)
+                    dir_mtimes[parent] = os.stat(parent).st_mtime_ns
+
+                    for filepath in files:
+                        mtime = os.stat(filepath).st_mtime_ns
+                        db_mtime = Objects.tracks.get_mtime(filepath, sql)
+                        if db_mtime == mtime:
+                            continue
+                        elif db_mtime is not None:
+                            self._remove_tracks([filepath], sql)
+                        f = Gio.File.new_for_path(filepath)
+                        if is_audio(f, self._by_extension):
+                            to_discover.append((filepath, mtime))
+                except Exception as e:
+                    print(ascii(path))
+                    print("CollectionScanner::_update_paths(): %s" % e)
+                    failed.add(os.path.dirname(path))
+
+            records = []
+            for (filepath, mtime, tags) in self._discover(to_discover,
+                                                          tags_sql):
+                try:
+                    if tags is not None:
+                        records.append(self._get_record(filepath, mtime, tags))
+                    else:
+                        failed.add(os.path.dirname(filepath))
+                except Exception as e:
+                    print(ascii(filepath))
+                    print("CollectionScanner::_update_paths(): %s" % e)
+                    failed.add(os.path.dirname(filepath))
+            failed |= self._add_batch(records, sql)
+
+            self._clean(sql)
+            for path in failed:
+                dir_mtimes[path] = 0
+            Objects.tracks.remove_dir_mtimes(removed, sql)
+            Objects.tracks.update_dir_mtimes(dir_mtimes, sql)
+            self._commit(sql)
+            tags_sql.commit()
+        finally:
+            self._clear_caches()
+            tags_sql.close()
+            GLib.idle_add(self._finish_update, new_dirs)
+
     """
         Scan music collection for music files
         @param paths as [string], paths to scan
     """
     def _scan(self, paths):
         sql = Objects.db.get_cursor()
+        tags_sql = Objects.tagcache.get_cursor()
+        self._load_caches(sql)
+        try:
+            tracks = set(Objects.tracks.get_paths(sql))
+            if self._full:
+                dir_mtimes = {}
+            else:
+                dir_mtimes = Objects.tracks.get_dir_mtimes(sql)
+            (new_tracks, unmodified, dir_mtimes) = self._walk(paths,
+                                                              dir_mtimes)
+            # Tracks from unmodified directories are not deleted
+            tracks = set(filepath for filepath in tracks
+                         if os.path.dirname(filepath) not in unmodified)
+            count = len(new_tracks)
+            i = 0
+            to_discover = []
+            to_remove = []
+            # Directories with files not read, their mtime is not saved
+            failed = set()
+            for filepath in new_tracks:
+                mtime = os.stat(filepath).st_mtime_ns
+                try:
+                    if filepath not in tracks:
+                        to_discover.append((filepath, mtime))
+                    else:
+                        # Update tags by removing song and readd it
+                        if mtime != self._mtimes[filepath]:
+                            to_remove.append(filepath)
+                            to_discover.append((filepath, mtime))
+                        else:
+                            i += 1
+                            GLib.idle_add(self._update_progress, i, count)
+                        tracks.discard(filepath)
+
+                except Exception as e:
+                    print(ascii(filepath))
+                    print("CollectionScanner::_scan(): %s" % e)
+                    failed.add(os.path.dirname(filepath))
+
+            # Clean deleted files
+            if new_tracks or unmodified:
+                to_remove += tracks
+                Objects.tagcache.remove_many(tracks, tags_sql)
+            self._remove_tracks(to_remove, sql)
+
+            records = []
+            for (filepath, mtime, tags) in self._discover(to_discover,
+                                                          tags_sql):
+                try:
+                    if tags is not None:
+                        records.append(self._get_record(filepath, mtime, tags))
+                    else:
+                        failed.add(os.path.dirname(filepath))
+                except Exception as e:
+                    print(ascii(filepath))
+                    print("CollectionScanner::_scan(): %s" % e)
+                    failed.add(os.path.dirname(filepath))
+                if len(records) >= self.BATCH_SIZE:
+                    failed |= self._add_batch(records, sql)
+                    self._commit(sql)
+                    records = []
+                i += 1
+                GLib.idle_add(self._update_progress, i, count)
+                if self._smooth:
+                    sleep(0.001)
+            failed |= self._add_batch(records, sql)
+
+            # Full scan also checks whole collection
+            self._clean(sql, self._full)
+            # Keep directories in walk but never unmodified,
+            # so next scan retries their files
+            for path in failed:
+                if path in dir_mtimes:
+                    dir_mtimes[path] = 0
+            Objects.tracks.set_dir_mtimes(dir_mtimes, sql)
+            self._commit(sql)
+            Objects.db.checkpoint(sql)
+            tags_sql.commit()
+        finally:
+            self._clear_caches()
+            tags_sql.close()
+            GLib.idle_add(self._finish)
 
-        tracks = Objects.tracks.get_paths(sql)
-        new_tracks = []
-        count = 0
-        for path in paths:
-            for root, dirs, files in os.walk(path):
-                for name in files:
-                    f = Gio.File.new_for_path(os.path.join(root, name))
-                    if is_audio(f):
-                        new_tracks.append(os.path.join(root, name))
-                        count += 1
-        i = 0
-        for filepath in new_tracks:
-            GLib.idle_add(self._update_progress, i, count)
-            mtime = int(os.path.getmtime(filepath))
+    """
+        Walk paths looking for music files
+        Directories with an unchanged mtime are not listed, their
+        subdirectories are known from previous walk
+        @param paths as [string]
+        @param previous mtimes as {path as string: mtime as int}
+        @return (music files as [string],
+                 unmodified directories as set(string),
+                 mtimes as {path as string: mtime as int})
+    """
+    def _walk(self, paths, previous_mtimes):
+        music_files = []
+        unmodified = set()
+        mtimes = {}
+        subdirs = {}
+        for path in previous_mtimes.keys():
+            parent = os.path.dirname(path)
+            if parent in subdirs:
+                subdirs[parent].append(path)
+            else:
+                subdirs[parent] = [path]
+
+        todo = list(paths)
+        while todo:
+            root = todo.pop(0)
             try:
-                if filepath not in tracks:
-                    infos = Objects.player.get_infos(filepath)
-                    if infos is not None:
-                        self._add2db(filepath, mtime, infos, sql)
+                mtime = os.stat(root).st_mtime_ns
+                if previous_mtimes.get(root) == mtime:
+                    unmodified.add(root)
+                    todo += subdirs.get(root, [])
                 else:
-                    # Update tags by removing song and readd it
-                    if mtime != self._mtimes[filepath]:
-                        track_id = Objects.tracks.get_id_by_path(filepath, sql)
-                        album_id = Objects.tracks.get_album_id(track_id, sql)
-                        Objects.tracks.remove(filepath, sql)
-                        self._clean_compilation(album_id, sql)
-                        infos = Objects.player.get_infos(filepath)
-                        if infos is not None:
-                            self._add2db(filepath, mtime, infos, sql)
-                    tracks.remove(filepath)
-
+                    for entry in os.scandir(root):
+                        if entry.is_dir(follow_symlinks=False):
+                            todo.append(entry.path)
+                        else:
+                            f = Gio.File.new_for_path(entry.path)
+                            if is_audio(f, self._by_extension):
+                                music_files.append(entry.path)
+                mtimes[root] = mtime
             except Exception as e:
-                print(ascii(filepath))
-                print("CollectionScanner::_scan(): %s" % e)
-            i += 1
-            if self._smooth:
-                sleep(0.001)
-
-        # Clean deleted files
-        if i > 0:
-            for filepath in tracks:
-                track_id = Objects.tracks.get_id_by_path(filepath, sql)
-                album_id = Objects.tracks.get_album_id(track_id, sql)
-                Objects.tracks.remove(filepath, sql)
-                self._clean_compilation(album_id, sql)
-
-        Objects.tracks.clean(sql)
-        Objects.albums.sanitize(sql)
-        self._restore_popularities(sql)
-        sql.commit()
-        sql.close()
-        GLib.idle_add(self._finish)
+                print("CollectionScanner::_walk(): %s" % e)
+        return (music_files, unmodified, mtimes)
+
+    """
+        Get tags for files, from cache if files did not change,
+        else read them. Cached files are returned first
+        @param files as [(filepath as string, mtime as int)]
+        @param sql as tag cache cursor
+        @return generator of (filepath as string, mtime as int,
+                              tags as TagReader::get_tags() or None)
+        @warning: tag cache commit needed
+    """
+    def _discover(self, files, sql):
+        to_read = []
+        for (filepath, mtime) in files:
+            try:
+                size = os.path.getsize(filepath)
+            except:
+                size = 0
+            tags = Objects.tagcache.get(filepath, size, mtime, sql)
+            if tags is None:
+                to_read.append((filepath, mtime, size))
+            else:
+                yield (filepath, mtime, tags)
+
+        entries = []
+        for (filepath, mtime, size, tags) in self._read_files(to_read):
+            if tags is not None:
+                entries.append((filepath, size, mtime, tags))
+            if len(entries) >= self.BATCH_SIZE:
+                Objects.tagcache.add_many(entries, sql)
+                sql.commit()
+                entries = []
+            yield (filepath, mtime, tags)
+        Objects.tagcache.add_many(entries, sql)
+
+    """
+        Read tags for files, in a pool of threads if enabled in settings
+        Results are returned in files order
+        @param files as [(filepath as string, mtime as int, size as int)]
+        @return generator of (filepath as string, mtime as int, size as int,
+                              tags as TagReader::get_tags() or None)
+    """
+    def _read_files(self, files):
+        workers = Objects.settings.get_value('scan-workers').get_int32()
+        if workers < 2:
+            tagreader = TagReader()
+            for (filepath, mtime, size) in files:
+                yield (filepath, mtime, size,
+                       self._read_tags(tagreader, filepath))
+            return
+
+        todo = Queue()
+        done = Queue()
+        for i in range(0, workers):
+            start_new_thread(self._read_worker, (todo, done))
+        # Do not queue more files than needed to keep workers busy,
+        # results are kept in memory until written
+        window = workers * 4
+        results = {}
+        queued = 0
+        try:
+            for index in range(0, len(files)):
+                while queued < len(files) and queued < index + window:
+                    todo.put((queued, files[queued][0]))
+                    queued += 1
+                while index not in results:
+                    (done_index, tags) = done.get()
+                    results[done_index] = tags
+                (filepath, mtime, size) = files[index]
+                yield (filepath, mtime, size, results.pop(index))
+        finally:
+            for i in range(0, workers):
+                todo.put(None)
+
+    """
+        Read tags for files in todo queue until None is found
+        @param todo as Queue of (index as int, filepath as string)
+        @param done as Queue of (index as int,
+                                 tags as TagReader::get_tags() or None)
+        @thread safe
+    """
+    def _read_worker(self, todo, done):
+        tagreader = TagReader()
+        while True:
+            item = todo.get()
+            if item is None:
+                break
+            (index, filepath) = item
+            done.put((index, self._read_tags(tagreader, filepath)))
+
+    """
+        Read tags for file
+        @param tagreader as TagReader
+        @param filepath as string
+        @return tags as TagReader::get_tags() or None
+    """
+    def _read_tags(self, tagreader, filepath):
+        try:
+            infos = tagreader.get_infos(filepath)
+            if infos is not None:
+                return tagreader.get_tags(infos)
+        except Exception as e:
+            print(ascii(filepath))
+            print("CollectionScanner::_read_tags(): %s" % e)
+        return None
 
     """
         Add new file to db with informations
         @param filepath as string
         @param file modification time as int
-        @param infos as GstPbutils.DiscovererInfo
+        @param tags as TagReader::get_tags()
         @param sql as sqlite cursor
         @return track id as int
+        @warning: commit needed
     """
-    def _add2db(self, filepath, mtime, infos, sql):
-        self._new_artist = False
-        self._new_genre = False
-        path = os.path.dirname(filepath)
+    def _add2db(self, filepath, mtime, tags, sql):
+        record = self._get_record(filepath, mtime, tags)
+        return self._add_records([record], sql)[0]
 
-        tags = infos.get_tags()
-
-        (exist, title) = tags.get_string_index('title', 0)
-        if not exist:
+    """
+        Get db record for file, with default values for missing tags
+        @param filepath as string
+        @param file modification time as int
+        @param tags as TagReader::get_tags()
+        @return (filepath as string, mtime as int, title as string,
+                 artists as string, album artist as string or None,
+                 album as string, genres as string, discnumber as int,
+                 tracknumber as int, year as int, length as int)
+    """
+    def _get_record(self, filepath, mtime, tags):
+        (title, artists, aartist, album, genres,
+         discnumber, tracknumber, year, length, art) = tags
+        if title is None:
             title = os.path.basename(filepath)
-
-        (exist, artists) = tags.get_string_index('artist', 0)
-        if not exist:
-            artists = _("Unknown")
-
-        artists = ""
-        size = tags.get_tag_size('artist')
-        if size == 0:
+        if artists is None:
             artists = _("Unknown")
-        else:
-            for i in range(0, size):
-                (exist, artist) = tags.get_string_index('artist', i)
-                artists += artist
-                if i < size-1:
-                    artists += ";"
-
-        (exist, aartist) = tags.get_string_index('album-artist', 0)
-        if not exist:
-            aartist = None
-
-        (exist, album) = tags.get_string_index('album', 0)
-        if not exist:
+        if album is None:
             album = _("Unknown")
-
-        genres = ""
-        size = tags.get_tag_size('genre')
-        if size == 0:
+        if genres is None:
             genres = _("Unknown")
-        else:
-            for i in range(0, size):
-                (exist, genre) = tags.get_string_index('genre', i)
-                genres += genre
-                if i < size-1:
-                    genres += ";"
-
-        (exist, discnumber) = tags.get_uint_index('disc-number', 0)
-        if not exist:
+        if discnumber is None:
             discnumber = 0
-
-        (exist, tracknumber) = tags.get_uint_index('track-number', 0)
-        if not exist:
+        if tracknumber is None:
             tracknumber = 0
+        return (filepath, mtime, title, artists, aartist, album,
+                genres, discnumber, tracknumber, year, length)
 
-        (exist, datetime) = tags.get_date_time('datetime')
-        if exist:
-            year = datetime.get_year()
-        else:
-            year = None
-
-        length = infos.get_duration()/1000000000
-
-        # Get all artist ids
-        artist_ids = []
-        for word in artists.split(';'):
-            artist = format_artist_name(word)
-            # Get artist id, add it if missing
-            artist_id = Objects.artists.get_id(artist, sql)
-            if artist_id is None:
-                Objects.artists.add(artist, sql)
+    """
+        Add records to db
+        Albums touched are stored in self._touched_albums,
+        their year need to be updated with
+        DatabaseAlbums::set_years_from_tracks()
+        @param records as [record], see _get_record()
+        @param sql as sqlite cursor
+        @return track ids as [int]
+        @warning: commit needed
+    """
+    def _add_records(self, records, sql):
+        tracks = []
+        track_artists = []
+        track_genres = []
+        album_genres = set()
+        album_paths = {}
+        for (filepath, mtime, title, artists, aartist, album,
+             genres, discnumber, tracknumber, year, length) in records:
+            path = os.path.dirname(filepath)
+
+            # Get all artist ids
+            artist_ids = []
+            new_artist_ids = []
+            for word in artists.split(';'):
+                artist = format_artist_name(word)
+                # Get artist id, add it if missing
                 artist_id = Objects.artists.get_id(artist, sql)
-                if artist == aartist:
-                    self._new_artist = True
-            artist_ids.append(artist_id)
-
-        if aartist:
-            aartist = format_artist_name(aartist)
-            # Get aartist id, add it if missing
-            aartist_id = Objects.artists.get_id(aartist, sql)
-            if aartist_id is None:
-                Objects.artists.add(aartist, sql)
+                if artist_id is None:
+                    artist_id = Objects.artists.add(artist, sql)
+                    new_artist_ids.append(artist_id)
+                if artist_id not in artist_ids:
+                    artist_ids.append(artist_id)
+
+            if aartist:
+                aartist = format_artist_name(aartist)
+                # Get aartist id, add it if missing
                 aartist_id = Objects.artists.get_id(aartist, sql)
-                self._new_artist = True
-        else:
-            aartist_id = Navigation.COMPILATIONS
-
-        # Get all genre ids
-        genre_ids = []
-        for genre in genres.split(';'):
-            # Get genre id, add genre if missing
-            genre_id = Objects.genres.get_id(genre, sql)
-            if genre_id is None:
-                Objects.genres.add(genre, sql)
+                if aartist_id is None:
+                    aartist_id = Objects.artists.add(aartist, sql)
+                    new_artist_ids.append(aartist_id)
+            else:
+                aartist_id = Navigation.COMPILATIONS
+
+            # Get all genre ids
+            genre_ids = []
+            for genre in genres.split(';'):
+                # Get genre id, add genre if missing
                 genre_id = Objects.genres.get_id(genre, sql)
-                self._new_genre = True
-            genre_ids.append(genre_id)
+                if genre_id is None:
+                    genre_id = Objects.genres.add(genre, sql)
+                    self._new_genres.append(genre_id)
+                if genre_id not in genre_ids:
+                    genre_ids.append(genre_id)
 
-        album_id = Objects.albums.get_id(album, aartist_id, sql)
-        if album_id is None:
-            Objects.albums.add(album, aartist_id,
-                               path, 0, sql)
             album_id = Objects.albums.get_id(album, aartist_id, sql)
+            if album_id is None:
+                album_id = Objects.albums.add(album, aartist_id,
+                                              path, 0, sql)
+            if aartist_id in new_artist_ids:
+                self._new_artists.append((aartist_id, album_id))
+            self._touched_albums.add(album_id)
+
+            for genre_id in genre_ids:
+                album_genres.add((album_id, genre_id))
+            # Album path is last track path
+            album_paths[album_id] = path
+
+            tracks.append((title, filepath, length, tracknumber,
+                           discnumber, album_id, year, mtime))
+            track_artists.append(artist_ids)
+            track_genres.append(genre_ids)
+
+        track_ids = Objects.tracks.add_many(tracks, sql)
+        artists = []
+        genres = []
+        for i in range(0, len(track_ids)):
+            if track_ids[i] is None:
+                continue
+            for artist_id in track_artists[i]:
+                artists.append((track_ids[i], artist_id))
+            for genre_id in track_genres[i]:
+                genres.append((track_ids[i], genre_id))
+        Objects.tracks.add_artists(artists, sql)
+        Objects.tracks.add_genres(genres, sql)
+        Objects.albums.add_genres(album_genres, sql)
+        Objects.albums.set_paths(album_paths, sql)
+        return track_ids
 
-        for genre_id in genre_ids:
-            Objects.albums.add_genre(album_id, genre_id, sql)
-
-        # Now we have our album id, check if path doesn't change
-        if Objects.albums.get_path(album_id, sql) != path:
-            Objects.albums.set_path(album_id, path, sql)
+    """
+        Add records to db
+        @param records as [record], see _get_record()
+        @param sql as sqlite cursor
+        @return directories of records not added as set of string
+        @warning: commit needed
+    """
+    def _add_batch(self, records, sql):
+        track_ids = self._add_records(records, sql)
+        return set(os.path.dirname(records[i][0])
+                   for i in range(0, len(records))
+                   if track_ids[i] is None)
 
-        # Add track to db
-        Objects.tracks.add(title, filepath, length,
-                           tracknumber, discnumber,
-                           album_id, year, mtime, sql)
-
-        # Update year for album
-        year = Objects.albums.get_year_from_tracks(album_id, sql)
-        Objects.albums.set_year(album_id, year, sql)
-
-        # Set artists/genres for track
-        track_id = Objects.tracks.get_id_by_path(filepath, sql)
-        for artist_id in artist_ids:
-            Objects.tracks.add_artist(track_id, artist_id, sql)
-        for genre_id in genre_ids:
-            Objects.tracks.add_genre(track_id, genre_id, sql)
-        if self._new_genre or self._new_artist:
-            sql.commit()
-            if self._new_genre:
-                GLib.idle_add(self.emit, "genre-update", genre_id)
-            if self._new_artist:
-                GLib.idle_add(self.emit, "artist-update", aartist_id, album_id)
-        return track_id
-
-    """
-        Restore albums popularties
-    """
-    def _restore_popularities(self, sql):
-        self._popularities = Objects.db.get_popularities()
-        result = sql.execute("SELECT albums.name, artists.name, albums.rowid\
-                              FROM albums, artists\
-                              WHERE artists.rowid == albums.artist_id")
-        for row in result:
-            string = "%s_%s" % (row[0], row[1])
-            if string in self._popularities:
-                Objects.albums.set_popularity(row[2],
-                                              self._popularities[string], sql)
+    """
+        Commit changes and notify new artists/genres from main thread
+        @param sql as sqlite cursor
+    """
+    def _commit(self, sql):
+        sql.commit()
+        # Other threads may have cached values read before commit
+        Objects.albums.lru.clear()
+        Objects.artists.lru.clear()
+        Objects.tracks.lru.clear()
+        for genre_id in self._new_genres:
+            GLib.idle_add(self.emit, "genre-update", genre_id)
+        for (artist_id, album_id) in self._new_artists:
+            GLib.idle_add(self.emit, "artist-update", artist_id, album_id)
+        self._new_genres = []
+        self._new_artists = []
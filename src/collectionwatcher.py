@@ -0,0 +1,166 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from gi.repository import GLib, Gio
+from _thread import start_new_thread
+
+from lollypop.define import Objects
+
+
+# Watch music directories and update collection on changes
+class CollectionWatcher:
+
+    # Wait for changes to settle before updating collection (ms)
+    DELAY = 2000
+
+    """
+        @param scanner as CollectionScanner
+    """
+    def __init__(self, scanner):
+        self._scanner = scanner
+        self._monitors = {}
+        self._changed = set()
+        self._timeout = None
+        self._scanner.connect("scan-finished", self._on_scan_finished)
+        self._scanner.connect("paths-updated", self._on_paths_updated)
+
+    """
+        Start watching music directories
+    """
+    def start(self):
+        start_new_thread(self._get_dirs, (self._scanner.get_paths(),))
+
+    """
+        Stop watching music directories
+    """
+    def stop(self):
+        for monitor in self._monitors.values():
+            monitor.cancel()
+        self._monitors = {}
+        if self._timeout:
+            GLib.source_remove(self._timeout)
+            self._timeout = None
+        self._changed = set()
+
+    """
+        True if watching music directories
+        @return bool
+    """
+    def is_running(self):
+        return len(self._monitors) > 0
+
+#######################
+# PRIVATE             #
+#######################
+
+    """
+        Get directories to watch, known by last scan or walk music paths
+        @param paths as [string]
+        @thread safe
+    """
+    def _get_dirs(self, paths):
+        with Objects.db.get_cursor() as sql:
+            dirs = list(Objects.tracks.get_dir_mtimes(sql).keys())
+        if not dirs:
+            for path in paths:
+                for root, subdirs, files in os.walk(path):
+                    dirs.append(root)
+        else:
+            dirs += paths
+        GLib.idle_add(self._watch_dirs, dirs)
+
+    """
+        Watch directories
+        @param dirs as [string]
+    """
+    def _watch_dirs(self, dirs):
+        for path in dirs:
+            self._watch_dir(path)
+
+    """
+        Watch directory
+        @param path as string
+    """
+    def _watch_dir(self, path):
+        if path in self._monitors:
+            return
+        try:
+            f = Gio.File.new_for_path(path)
+            monitor = f.monitor_directory(Gio.FileMonitorFlags.NONE, None)
+            monitor.connect('changed', self._on_changed)
+            self._monitors[path] = monitor
+        except Exception as e:
+            print("CollectionWatcher::_watch_dir(): %s" % e)
+
+    """
+        Stop watching directory and its subdirectories
+        @param path as string
+    """
+    def _unwatch_dir(self, path):
+        for monitored in list(self._monitors.keys()):
+            if monitored == path or monitored.startswith(path + "/"):
+                self._monitors.pop(monitored).cancel()
+
+    """
+        Queue changed path and delay collection update
+        @param monitor as Gio.FileMonitor
+        @param f as Gio.File
+        @param other as Gio.File
+        @param event as Gio.FileMonitorEvent
+    """
+    def _on_changed(self, monitor, f, other, event):
+        path = f.get_path()
+        if path is None:
+            return
+        if event == Gio.FileMonitorEvent.CREATED:
+            # Subdirectories are watched when scanner found them
+            if os.path.isdir(path):
+                self._watch_dir(path)
+        elif event == Gio.FileMonitorEvent.DELETED:
+            self._unwatch_dir(path)
+        elif event != Gio.FileMonitorEvent.CHANGES_DONE_HINT:
+            return
+
+        self._changed.add(path)
+        if self._timeout:
+            GLib.source_remove(self._timeout)
+        self._timeout = GLib.timeout_add(self.DELAY, self._update)
+
+    """
+        Update collection for changed paths,
+        retry later if scanner is running
+    """
+    def _update(self):
+        self._timeout = None
+        if self._scanner.update_paths(list(self._changed)):
+            self._changed = set()
+        else:
+            self._timeout = GLib.timeout_add(self.DELAY, self._update)
+
+    """
+        Watch directories found by scanner
+        @param scanner as CollectionScanner
+    """
+    def _on_scan_finished(self, scanner):
+        if self.is_running():
+            self.start()
+
+    """
+        Watch directories found by scanner in updated paths
+        @param scanner as CollectionScanner
+        @param dirs as [string]
+    """
+    def _on_paths_updated(self, scanner, dirs):
+        if self.is_running():
+            self._watch_dirs(dirs)
@@ -23,6 +23,7 @@ from lollypop.playlists import PlaylistsManager
 from lollypop.view import AlbumView, ArtistView, DeviceView
 from lollypop.view import PlaylistView, PlaylistManageView
 from lollypop.collectionscanner import CollectionScanner
+from lollypop.collectionwatcher import CollectionWatcher
 
 
 # This is a multimedia device
@@ -102,7 +103,7 @@ class Container(ViewContainer):
     def update_db(self, force=False):
         if not self._progress.is_visible():
             if force or Objects.tracks.is_empty():
-                self._scanner.update(False)
+                self._scanner.update(False, force)
             elif Objects.settings.get_value('startup-scan') or\
                  Objects.settings.get_value('force-scan'):
                 self._scanner.update(True)
@@ -159,7 +160,7 @@ class Container(ViewContainer):
         # We wait as selection list is threaded,
         # we don't want to insert item before populated
         if self._list_one_restore is None:
-            start_new_thread(self._scanner.add, (files,))
+            self._scanner.add(files)
         else:
             GLib.timeout_add(250, self.load_external, files)
 
@@ -278,6 +279,10 @@ class Container(ViewContainer):
         self._scanner.connect("genre-update", self._add_genre)
         self._scanner.connect("artist-update", self._add_artist)
         self._scanner.connect("add-finished", self._play_tracks)
+        self._scanner.connect("paths-updated", self._on_paths_updated)
+        self._watcher = CollectionWatcher(self._scanner)
+        if Objects.settings.get_value('watch-collection'):
+            self._watcher.start()
 
     """
         Update list one
@@ -327,14 +332,13 @@ class Container(ViewContainer):
         @thread safe
     """
     def _setup_list_genres(self, selection_list, update):
-        sql = Objects.db.get_cursor()
         selection_list.mark_as_artists(False)
-        items = self._get_headers() + Objects.genres.get(sql)
+        with Objects.db.get_cursor() as sql:
+            items = self._get_headers() + Objects.genres.get(sql)
         if update:
             GLib.idle_add(selection_list.update, items)
         else:
             selection_list.populate(items)
-        sql.close()
 
     """
         Hide list two base on current artist list
@@ -353,21 +357,20 @@ class Container(ViewContainer):
     """
     def _setup_list_artists(self, selection_list, genre_id, update):
         GLib.idle_add(self._pre_setup_list_artists, selection_list)
-        sql = Objects.db.get_cursor()
         items = []
         selection_list.mark_as_artists(True)
         if selection_list == self._list_one:
             items = self._get_headers()
-        if len(Objects.albums.get_compilations(genre_id, sql)) > 0:
-            items.append((Navigation.COMPILATIONS, _("Compilations")))
+        with Objects.db.get_cursor() as sql:
+            if len(Objects.albums.get_compilations(genre_id, sql)) > 0:
+                items.append((Navigation.COMPILATIONS, _("Compilations")))
 
-        items += Objects.artists.get(genre_id, sql)
+            items += Objects.artists.get(genre_id, sql)
 
         if update:
             GLib.idle_add(selection_list.update, items)
         else:
             selection_list.populate(items)
-        sql.close()
 
     """
         Setup list for playlists
@@ -570,10 +573,11 @@ class Container(ViewContainer):
                 self._clean_view(old_view)
 
     """
-        Play tracks as user playlist
+        Reload player tracks, play added tracks as user playlist
         @param scanner as collection scanner
     """
     def _play_tracks(self, scanner):
+        Objects.player.update_tracks()
         ids = scanner.get_added()
         if ids:
             if not Objects.player.is_party():
@@ -581,12 +585,22 @@ class Container(ViewContainer):
             Objects.player.load(ids[0])
 
     """
-        Mark force scan as False, update lists
+        Mark force scan as False, reload player tracks, update lists
         @param scanner as CollectionScanner
     """
     def _on_scan_finished(self, scanner):
         Objects.settings.set_value('force-scan',
                                    GLib.Variant('b', False))
+        Objects.player.update_tracks()
+        self.update_lists(scanner)
+
+    """
+        Reload player tracks, update lists
+        @param scanner as CollectionScanner
+        @param dirs as [string], unused
+    """
+    def _on_paths_updated(self, scanner, dirs):
+        Objects.player.update_tracks()
         self.update_lists(scanner)
 
     """
@@ -13,9 +13,13 @@
 
 import sqlite3
 import os
+from threading import local
+from traceback import print_exc
 from gi.repository import GLib
 
 from lollypop.define import Objects
+from lollypop.database_upgrade import DatabaseUpgrade
+from lollypop.database_search import DatabaseSearch
 
 
 class Database:
@@ -35,9 +39,11 @@ class Database:
                         artist_id INT NOT NULL,
                         year INT,
                         path TEXT NOT NULL,
-                        popularity INT NOT NULL)'''
+                        popularity INT NOT NULL,
+                        search_name TEXT)'''
     create_artists = '''CREATE TABLE artists (id INTEGER PRIMARY KEY,
-                                              name TEXT NOT NULL)'''
+                                              name TEXT NOT NULL,
+                                              search_name TEXT)'''
     create_genres = '''CREATE TABLE genres (id INTEGER PRIMARY KEY,
                                             name TEXT NOT NULL)'''
     create_album_genres = '''CREATE TABLE album_genres (
@@ -46,25 +52,51 @@ class Database:
     create_tracks = '''CREATE TABLE tracks (id INTEGER PRIMARY KEY,
                         name TEXT NOT NULL,
                         filepath TEXT NOT NULL,
-                        length INT,
+                        length REAL,
                         tracknumber INT,
                         discnumber INT,
                         album_id INT NOT NULL,
                         year INT,
-                        mtime INT)'''
+                        mtime INT,
+                        search_name TEXT)'''
     create_track_artists = '''CREATE TABLE track_artists (
                                                     track_id INT NOT NULL,
                                                     artist_id INT NOT NULL)'''
     create_track_genres = '''CREATE TABLE track_genres (
                                                     track_id INT NOT NULL,
                                                     genre_id INT NOT NULL)'''
-    version = 5
+    create_directories = '''CREATE TABLE directories (
+                                                    path TEXT PRIMARY KEY,
+                                                    mtime INT NOT NULL)'''
+    create_track_stats = '''CREATE TABLE track_stats (
+                                                filepath TEXT PRIMARY KEY,
+                                                playcount INT NOT NULL,
+                                                skipcount INT NOT NULL,
+                                                lastplayed INT)'''
+
+    # Seconds a writer waits for another one before "database is locked"
+    BUSY_TIMEOUT = 30
+
+    """
+        Run on each new cursor:
+        Readers do not block writer with a write ahead log,
+        commits only sync log at checkpoints,
+        log is checkpointed every 1000 pages and truncated to 4MB after,
+        keep 16MB of pages in cache and map 256MB of db in memory
+    """
+    PRAGMAS = ["PRAGMA journal_mode=WAL",
+               "PRAGMA synchronous=NORMAL",
+               "PRAGMA wal_autocheckpoint=1000",
+               "PRAGMA journal_size_limit=4194304",
+               "PRAGMA cache_size=-16000",
+               "PRAGMA mmap_size=268435456"]
 
     """
         Create database tables or manage update if needed
     """
     def __init__(self):
-        self._popularity_backup = {}
+        # Cursors by thread
+        self._local = local()
         # Create db directory if missing
         if not os.path.exists(self.LOCAL_PATH):
             try:
@@ -72,65 +104,94 @@ class Database:
             except:
                 print("Can't create %s" % self.LOCAL_PATH)
 
-        if os.path.exists(self.DB_PATH):
-            db_version = Objects.settings.get_value('db-version').get_int32()
-            if db_version < self.version:
-                self._set_popularities()
-                os.remove(self.DB_PATH)
-                Objects.settings.set_value('db-version',
-                                           GLib.Variant('i', self.version))
-
+        db_version = Objects.settings.get_value('db-version').get_int32()
         sql = self.get_cursor()
+        upgrade = DatabaseUpgrade(db_version, sql)
         # Create db schema
         try:
-            sql.execute(self.create_albums)
-            sql.execute(self.create_artists)
-            sql.execute(self.create_genres)
-            sql.execute(self.create_album_genres)
-            sql.execute(self.create_tracks)
-            sql.execute(self.create_track_artists)
-            sql.execute(self.create_track_genres)
-            sql.commit()
-            Objects.settings.set_value('db-version',
-                                       GLib.Variant('i', self.version))
+            self._create_schema(sql)
+            db_version = upgrade.get_version()
+        # Schema exists, upgrade it
         except:
-            pass
+            try:
+                db_version = upgrade.do_db_upgrade()
+            # Start with an empty db, collection is scanned again
+            except Exception as e:
+                print("Database::__init__(): upgrade failed: %s" % e)
+                print_exc()
+                self._create_schema(self._reset())
+                db_version = upgrade.get_version()
+        Objects.settings.set_value('db-version',
+                                   GLib.Variant('i', db_version))
 
     """
-        Get a dict with album path and popularity
-        This is usefull for collection scanner be
-        able to restore popularities after db reset
+        Return sqlite cursor for current thread, opened on first call
+        Do not close it, use it as a context manager to commit changes:
+        with Objects.db.get_cursor() as sql:
+        @return sqlite3.Connection
     """
-    def get_popularities(self):
-        return self._popularity_backup
-
-###########
-# Private #
-###########
+    def get_cursor(self):
+        sql = getattr(self._local, 'sql', None)
+        if sql is None:
+            try:
+                sql = sqlite3.connect(self.DB_PATH,
+                                      timeout=self.BUSY_TIMEOUT)
+            except:
+                exit(-1)
+            for pragma in self.PRAGMAS:
+                sql.execute(pragma)
+            self._local.sql = sql
+        return sql
 
     """
-        Set a dict with album string and popularity
-        This is usefull for collection scanner be
-        able to restore popularities after db reset
+        Write back log to db after large changes, readers may prevent
+        automatic checkpoints to complete and let log grow
+        Wait for readers and truncate log
+        @param sql as sqlite cursor
     """
-    def _set_popularities(self):
+    def checkpoint(self, sql):
         try:
-            sql = self.get_cursor()
-            result = sql.execute("SELECT albums.name, artists.name, popularity\
-                                  FROM albums, artists\
-                                  WHERE artists.rowid == albums.artist_id")
-            for row in result:
-                string = "%s_%s" % (row[0], row[1])
-                self._popularity_backup[string] = row[2]
-            sql.close()
+            sql.execute("PRAGMA wal_checkpoint(TRUNCATE)")
         except Exception as e:
-            print("Database::_set_popularities: %s" % e)
+            print("Database::checkpoint(): %s" % e)
 
+#######################
+# PRIVATE             #
+#######################
     """
-        Return a new sqlite cursor
+        Create db schema
+        @param sql as sqlite cursor
+        @raise sqlite3.OperationalError if schema exists
     """
-    def get_cursor(self):
-        try:
-            return sqlite3.connect(self.DB_PATH)
-        except:
-            exit(-1)
+    def _create_schema(self, sql):
+        sql.execute(self.create_albums)
+        sql.execute(self.create_artists)
+        sql.execute(self.create_genres)
+        sql.execute(self.create_album_genres)
+        sql.execute(self.create_tracks)
+        sql.execute(self.create_track_artists)
+        sql.execute(self.create_track_genres)
+        sql.execute(self.create_directories)
+        sql.execute(self.create_track_stats)
+        for request in DatabaseUpgrade.INDEXES:
+            sql.execute(request)
+        for request in DatabaseSearch.TABLES:
+            sql.execute(request)
+        sql.commit()
+
+    """
+        Move db to a backup file and open an empty one
+        @return sqlite cursor for current thread
+    """
+    def _reset(self):
+        self._local.sql.close()
+        self._local.sql = None
+        for suffix in ["", "-wal", "-shm"]:
+            backup = "%s.backup%s" % (self.DB_PATH, suffix)
+            # Do not mix log of an older backup with this one
+            if os.path.exists(backup):
+                os.remove(backup)
+            if os.path.exists(self.DB_PATH + suffix):
+                os.replace(self.DB_PATH + suffix, backup)
+        print("Database::_reset(): old db saved to %s.backup" % self.DB_PATH)
+        return self.get_cursor()
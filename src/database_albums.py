@@ -13,27 +13,63 @@
 
 from gettext import gettext as _
 from lollypop.define import Objects, Navigation
+from lollypop.utils import normalize_name
+from lollypop.lrucache import LRUCache, cached
+
+
+# Album fields needed for display, see DatabaseAlbums::get_records()
+class AlbumRecord:
+    """
+        @param album id as int
+        @param name as string
+        @param artist id as int
+        @param artist name as string
+        @param year as string
+        @param path as string
+    """
+    def __init__(self, album_id, name, artist_id, artist_name, year, path):
+        self.id = album_id
+        self.name = name
+        self.artist_id = artist_id
+        self.artist_name = artist_name
+        self.year = year
+        self.path = path
 
 
 # All functions take a sqlite cursor as last parameter,
 # set another one if you're in a thread
 class DatabaseAlbums:
     def __init__(self):
-        pass
+        # (name, artist id) to id cache used while scanning collection
+        self._cache = None
+        # id to (name, artist id), used to update cache
+        self._cache_keys = None
+        # Cursor cache was loaded with, only used with it
+        self._cache_sql = None
+        # Scalar getters cache, scanner invalidates it
+        self.lru = LRUCache(2000)
 
     """
         Add a new album to database
         @param Album name as string
         @param artist id as int,
         @param path as string
+        @return album id as int
         @warning: commit needed
     """
     def add(self, name, artist_id, path, popularity, sql=None):
         if not sql:
             sql = Objects.sql
-        sql.execute("INSERT INTO albums (name, artist_id, path,"
-                    "popularity) VALUES (?, ?, ?, ?)",
-                    (name, artist_id, path, popularity))
+        result = sql.execute("INSERT INTO albums (name, artist_id, path,"
+                             "popularity, search_name)"
+                             " VALUES (?, ?, ?, ?, ?)",
+                             (name, artist_id, path, popularity,
+                              normalize_name(name)))
+        # Rowid may be reused from a removed album
+        self.lru.remove([result.lastrowid])
+        if self._cache is not None and sql is self._cache_sql:
+            self._cache_add(result.lastrowid, name, artist_id)
+        return result.lastrowid
 
     """
         Add genre to album
@@ -49,6 +85,20 @@ class DatabaseAlbums:
             sql.execute("INSERT INTO album_genres (album_id, genre_id)"
                         "VALUES (?, ?)", (album_id, genre_id))
 
+    """
+        Add genres to albums, ignore existing ones
+        @param album genres as [(album id as int, genre id as int)]
+        @warning: commit needed
+    """
+    def add_genres(self, album_genres, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.executemany("INSERT INTO album_genres (album_id, genre_id)\
+                         SELECT ?1, ?2 WHERE NOT EXISTS\
+                            (SELECT * FROM album_genres\
+                             WHERE album_id=?1 AND genre_id=?2)",
+                        album_genres)
+
     """
         Set artist id
         @param album id as int, artist_id as int
@@ -59,6 +109,11 @@ class DatabaseAlbums:
             sql = Objects.sql
         sql.execute("UPDATE albums SET artist_id=? WHERE rowid=?",
                     (artist_id, album_id))
+        self.lru.remove([album_id])
+        if self._cache is not None and sql is self._cache_sql and\
+           album_id in self._cache_keys:
+            name = self._cache_remove(album_id)[0]
+            self._cache_add(album_id, name, artist_id)
 
     """
         Set year
@@ -71,6 +126,7 @@ class DatabaseAlbums:
             sql = Objects.sql
         sql.execute("UPDATE albums SET year=? WHERE rowid=?",
                     (year, album_id))
+        self.lru.remove([album_id])
 
     """
         Set album path for album id
@@ -81,6 +137,39 @@ class DatabaseAlbums:
         if not sql:
             sql = Objects.sql
         sql.execute("UPDATE albums SET path=? WHERE rowid=?", (path, album_id))
+        self.lru.remove([album_id])
+
+    """
+        Set albums path
+        @param paths as {album id as int: path as string}
+        @warning: commit needed
+    """
+    def set_paths(self, paths, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.executemany("UPDATE albums SET path=? WHERE rowid=?",
+                        [(path, album_id) for (album_id, path)
+                         in paths.items()])
+        self.lru.remove(paths.keys())
+
+    """
+        Set albums year based on tracks
+        Use most used year by tracks, see get_year_from_tracks()
+        @param album ids as [int]
+        @warning: commit needed
+    """
+    def set_years_from_tracks(self, album_ids, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.executemany("UPDATE albums SET year=\
+                            (SELECT year FROM tracks\
+                             WHERE tracks.album_id=?1\
+                             GROUP BY year\
+                             ORDER BY COUNT(year) DESC\
+                             LIMIT 1)\
+                         WHERE rowid=?1",
+                        [(album_id,) for album_id in album_ids])
+        self.lru.remove(album_ids)
 
     """
         Set popularity
@@ -93,25 +182,19 @@ class DatabaseAlbums:
             sql = Objects.sql
         sql.execute("UPDATE albums set popularity=? WHERE rowid=?",
                     (popularity, album_id))
+
     """
-        Increment popularity field for album id
-        @param int
-        @raise sqlite3.OperationalError on db update
+        Increment popularity of many albums
+        @param increments as [(album id as int, increment as int)]
+        @warning: commit needed
     """
-    def set_more_popular(self, album_id, sql=None):
+    def add_popularities(self, increments, sql=None):
         if not sql:
             sql = Objects.sql
-        result = sql.execute("SELECT popularity from albums WHERE rowid=?",
-                             (album_id,))
-        pop = result.fetchone()
-        if pop:
-            current = pop[0]
-        else:
-            current = 0
-        current += 1
-        sql.execute("UPDATE albums set popularity=? WHERE rowid=?",
-                    (current, album_id))
-        sql.commit()
+        sql.executemany("UPDATE albums SET popularity=popularity+?\
+                         WHERE rowid=?",
+                        [(increment, album_id)
+                         for (album_id, increment) in increments])
 
     """
         Get album id
@@ -122,6 +205,8 @@ class DatabaseAlbums:
     def get_id(self, album_name, artist_id, sql=None):
         if not sql:
             sql = Objects.sql
+        if self._cache is not None and sql is self._cache_sql:
+            return self._cache.get((album_name, artist_id))
         result = sql.execute("SELECT rowid FROM albums where name=?\
                               AND artist_id=?", (album_name,
                                                  artist_id))
@@ -131,6 +216,37 @@ class DatabaseAlbums:
 
         return None
 
+    """
+        Load a (name, artist id) to id cache,
+        get_id() with sql will not query db anymore
+        @warning: cache need to be cleared with clear_cache()
+    """
+    def load_cache(self, sql=None):
+        if not sql:
+            sql = Objects.sql
+        self._cache = {}
+        self._cache_keys = {}
+        self._cache_sql = sql
+        result = sql.execute("SELECT rowid, name, artist_id FROM albums\
+                              ORDER BY rowid")
+        for (album_id, name, artist_id) in result:
+            self._cache_add(album_id, name, artist_id)
+
+    """
+        Reload cache if loaded, needed after album deletion
+    """
+    def reload_cache(self, sql=None):
+        if self._cache is not None:
+            self.load_cache(sql)
+
+    """
+        Clear cache, get_id() will query db
+    """
+    def clear_cache(self):
+        self._cache = None
+        self._cache_keys = None
+        self._cache_sql = None
+
     """
         Get genre ids
         @param Album id as int
@@ -169,6 +285,7 @@ class DatabaseAlbums:
         @param Album id as int
         @return Album name as string
     """
+    @cached('name')
     def get_name(self, album_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -180,11 +297,54 @@ class DatabaseAlbums:
 
         return _("Unknown")
 
+    """
+        Get display fields for albums, in one query
+        @param album ids as [int]
+        @return {album id as int: AlbumRecord}
+    """
+    def get_records(self, album_ids, sql=None):
+        if not sql:
+            sql = Objects.sql
+        records = {}
+        album_ids = list(album_ids)
+        # Do not hit sqlite variables limit
+        for i in range(0, len(album_ids), 500):
+            chunk = album_ids[i:i+500]
+            result = sql.execute("SELECT albums.rowid, albums.name,\
+                                  albums.artist_id, artists.name,\
+                                  albums.year, albums.path\
+                                  FROM albums LEFT JOIN artists\
+                                  ON artists.rowid=albums.artist_id\
+                                  WHERE albums.rowid IN (%s)" %
+                                 ",".join("?" * len(chunk)), chunk)
+            for (album_id, name, artist_id,
+                 artist_name, year, path) in result:
+                if artist_name is None:
+                    artist_name = _("Compilation")
+                records[album_id] = AlbumRecord(album_id, name, artist_id,
+                                                artist_name,
+                                                str(year) if year else "",
+                                                path)
+        return records
+
+    """
+        Get display fields for album
+        @param album id as int
+        @return AlbumRecord
+    """
+    def get_record(self, album_id, sql=None):
+        records = self.get_records([album_id], sql)
+        if album_id in records:
+            return records[album_id]
+        return AlbumRecord(album_id, _("Unknown"), None,
+                           _("Compilation"), "", "")
+
     """
         Get artist name
         @param Album id as int
         @return Artist name as string
     """
+    @cached('artist_name')
     def get_artist_name(self, album_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -202,6 +362,7 @@ class DatabaseAlbums:
         @param album_id
         @return artist id
     """
+    @cached('artist_id')
     def get_artist_id(self, album_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -236,6 +397,7 @@ class DatabaseAlbums:
         @param album id as int
         @return album year as string
     """
+    @cached('year')
     def get_year(self, album_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -253,6 +415,7 @@ class DatabaseAlbums:
         @param Album id as int
         @return Album path as string
     """
+    @cached('path')
     def get_path(self, album_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -294,6 +457,16 @@ class DatabaseAlbums:
             albums += row
         return albums
 
+    """
+        Get popularity of all albums
+        @return {album id as int: popularity as int}
+    """
+    def get_popularities(self, sql=None):
+        if not sql:
+            sql = Objects.sql
+        result = sql.execute("SELECT rowid, popularity FROM albums")
+        return dict(result.fetchall())
+
     """
         Get album ids for party mode based on genre ids
         @param Array of genre ids
@@ -395,52 +568,56 @@ class DatabaseAlbums:
         return tracks
 
     """
-        Get tracks informations for album id
-        Will search track from albums from same artist
-        with same name and different genre
-        @param album id as int
+        Get tracks informations for album ids, in one query
+        @param album ids as [int]
         @param genre id as int
-        @return Arrays of (tracks id as int, name as string,
-                           length as int, [artist ids])
+        @return {album id as int: [(track id as int, name as string,
+                                    length as int, [artist ids as int],
+                                    [artist names as string])]}
     """
-    def get_tracks_infos(self, album_id, genre_id, sql=None):
+    def get_tracks_infos(self, album_ids, genre_id, sql=None):
         if not sql:
             sql = Objects.sql
-
-        if genre_id is not None and genre_id > 0:
-            result = sql.execute("SELECT tracks.rowid,\
-                                  tracks.name,\
-                                  tracks.length\
-                                  FROM tracks, albums,\
-                                  track_artists, track_genres\
-                                  WHERE albums.rowid=?\
-                                  AND albums.rowid = tracks.album_id\
-                                  AND tracks.rowid = track_artists.track_id\
-                                  AND tracks.rowid = track_genres.track_id\
-                                  AND track_genres.genre_id=?\
-                                  ORDER BY discnumber, tracknumber",
-                                 (album_id, genre_id))
-        else:
-            result = sql.execute("SELECT tracks.rowid,\
-                                  tracks.name,\
-                                  tracks.length\
-                                  FROM tracks, track_artists, albums\
-                                  WHERE albums.rowid = ?\
-                                  AND albums.rowid = tracks.album_id\
-                                  AND track_artists.track_id = tracks.rowid\
-                                  ORDER BY discnumber, tracknumber",
-                                 (album_id,))
-
-        infos = []
-        rm_doublon = []
-        for row in result:
-            # Check for doublon
-            if row[0] not in rm_doublon:
-                rm_doublon.append(row[0])
-                # Add artists
-                row += (Objects.tracks.get_artist_ids(row[0], sql),)
-                infos.append(row,)
-        del rm_doublon
+        infos = {}
+        album_ids = list(album_ids)
+        # Do not hit sqlite variables limit
+        for i in range(0, len(album_ids), 500):
+            chunk = album_ids[i:i+500]
+            filters = ",".join("?" * len(chunk))
+            if genre_id is not None and genre_id > 0:
+                result = sql.execute("SELECT tracks.album_id, tracks.rowid,\
+                                      tracks.name, tracks.length,\
+                                      artists.rowid, artists.name\
+                                      FROM tracks, track_artists, artists\
+                                      WHERE tracks.album_id IN (%s)\
+                                      AND track_artists.track_id=tracks.rowid\
+                                      AND artists.rowid=artist_id\
+                                      AND tracks.rowid IN\
+                                        (SELECT track_id FROM track_genres\
+                                         WHERE genre_id=?)\
+                                      ORDER BY tracks.album_id, discnumber,\
+                                      tracknumber, tracks.rowid,\
+                                      track_artists.rowid" % filters,
+                                     chunk + [genre_id])
+            else:
+                result = sql.execute("SELECT tracks.album_id, tracks.rowid,\
+                                      tracks.name, tracks.length,\
+                                      artists.rowid, artists.name\
+                                      FROM tracks, track_artists, artists\
+                                      WHERE tracks.album_id IN (%s)\
+                                      AND track_artists.track_id=tracks.rowid\
+                                      AND artists.rowid=artist_id\
+                                      ORDER BY tracks.album_id, discnumber,\
+                                      tracknumber, tracks.rowid,\
+                                      track_artists.rowid" % filters, chunk)
+            track = None
+            for (album_id, track_id, name, length,
+                 artist_id, artist_name) in result:
+                if track is None or track[0] != track_id:
+                    track = (track_id, name, length, [], [])
+                    infos.setdefault(album_id, []).append(track)
+                track[3].append(artist_id)
+                track[4].append(artist_name)
         return infos
 
     """
@@ -540,6 +717,7 @@ class DatabaseAlbums:
         Sanitize compilations, after scan some albums marked
         as compilation (no artist album)
         can be albums => all tracks are from the same artist
+        @return merged into album ids as set of int
         @warning commit needed
     """
     def sanitize(self, sql):
@@ -554,8 +732,47 @@ class DatabaseAlbums:
                               GROUP BY album_id\
                               HAVING COUNT(DISTINCT track_artists.artist_id)\
                               == 1", (Navigation.COMPILATIONS,))
+        return self._sanitize(result.fetchall(), sql)
 
-        for artist_id, album_id, album_name, in result:
+    """
+        Sanitize compilations, only check given albums,
+        use sanitize() to check whole database
+        @param album ids as set of int
+        @return merged into album ids as set of int
+        @warning commit needed
+    """
+    def sanitize_ids(self, album_ids, sql=None):
+        if not sql:
+            sql = Objects.sql
+        albums = []
+        for album_id in album_ids:
+            result = sql.execute("SELECT DISTINCT track_artists.artist_id,\
+                                  album_id, albums.name\
+                                  FROM tracks, albums, track_artists\
+                                  WHERE albums.rowid = ?\
+                                  AND albums.artist_id = ?\
+                                  AND tracks.album_id = albums.rowid\
+                                  AND track_artists.track_id = tracks.rowid\
+                                  GROUP BY album_id\
+                                  HAVING\
+                                    COUNT(DISTINCT track_artists.artist_id)\
+                                  == 1", (album_id, Navigation.COMPILATIONS))
+            albums += result.fetchall()
+        return self._sanitize(albums, sql)
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Merge compilations with only one artist into artist album
+        @param albums as [(artist id as int, album id as int,
+                           album name as string)]
+        @return merged into album ids as set of int
+        @warning commit needed
+    """
+    def _sanitize(self, albums, sql):
+        merged_ids = set()
+        for artist_id, album_id, album_name, in albums:
             existing_id = self.get_id(album_name, artist_id, sql)
             # Some tracks from album have an album artist and some not
             if existing_id is not None and existing_id != album_id:
@@ -563,26 +780,41 @@ class DatabaseAlbums:
                             (existing_id, album_id))
                 for genre_id in self.get_genre_ids(album_id, sql):
                     self.add_genre(existing_id, genre_id, sql)
+                sql.execute("DELETE FROM album_genres WHERE album_id = ?",
+                            (album_id,))
                 sql.execute("DELETE FROM albums WHERE rowid = ?",
                             (album_id,))
+                self.lru.remove([album_id])
+                # Tracks moved to existing album
+                Objects.tracks.lru.clear()
+                if self._cache is not None and sql is self._cache_sql and\
+                   album_id in self._cache_keys:
+                    self._cache_remove(album_id)
+                merged_ids.add(existing_id)
             # Album is not a compilation,
             # so update album id to march track album id
             else:
-                sql.execute("UPDATE albums SET artist_id=? WHERE rowid=?",
-                            (artist_id, album_id))
+                self.set_artist_id(album_id, artist_id, sql)
+        return merged_ids
 
     """
-        Search for albums looking like string
-        @param string
-        return: Array of (id as int, artist_id as int)
+        Add album to cache
+        @param album id as int
+        @param name as string
+        @param artist id as int
     """
-    def search(self, string, sql=None):
-        if not sql:
-            sql = Objects.sql
-        albums = []
-        result = sql.execute("SELECT rowid, artist_id FROM albums\
-                              WHERE name LIKE ?\
-                              LIMIT 25", ('%'+string+'%',))
-        for row in result:
-            albums += (row,)
-        return albums
+    def _cache_add(self, album_id, name, artist_id):
+        key = (name, artist_id)
+        if key not in self._cache:
+            self._cache[key] = album_id
+            self._cache_keys[album_id] = key
+
+    """
+        Remove album from cache
+        @param album id as int
+        @return (name as string, artist id as int)
+    """
+    def _cache_remove(self, album_id):
+        key = self._cache_keys.pop(album_id)
+        del self._cache[key]
+        return key
@@ -14,24 +14,37 @@
 from gettext import gettext as _
 
 from lollypop.define import Objects, Navigation
+from lollypop.utils import normalize_name
+from lollypop.lrucache import LRUCache, cached
 
 
 # All functions take a sqlite cursor as last parameter,
 # set another one if you're in a thread
 class DatabaseArtists:
     def __init__(self):
-        pass
+        # Name to id cache used while scanning collection
+        self._cache = None
+        # Cursor cache was loaded with, only used with it
+        self._cache_sql = None
+        # Scalar getters cache, scanner invalidates it
+        self.lru = LRUCache(2000)
 
     """
         Add a new artist to database
         @param Artist name as string
+        @return artist id as int
         @warning: commit needed
     """
     def add(self, name, sql=None):
         if not sql:
             sql = Objects.sql
-        sql.execute("INSERT INTO artists (name) VALUES (?)",
-                    (name,))
+        result = sql.execute("INSERT INTO artists (name, search_name)\
+                              VALUES (?, ?)", (name, normalize_name(name)))
+        # Rowid may be reused from a removed artist
+        self.lru.remove([result.lastrowid])
+        if self._cache is not None and sql is self._cache_sql:
+            self._cache.setdefault(name, result.lastrowid)
+        return result.lastrowid
 
     """
         Get artist id
@@ -41,7 +54,8 @@ class DatabaseArtists:
     def get_id(self, name, sql=None):
         if not sql:
             sql = Objects.sql
-
+        if self._cache is not None and sql is self._cache_sql:
+            return self._cache.get(name)
         result = sql.execute("SELECT rowid from artists\
                               WHERE name=?", (name,))
         v = result.fetchone()
@@ -50,11 +64,40 @@ class DatabaseArtists:
 
         return None
 
+    """
+        Load a name to id cache, get_id() with sql will not query db anymore
+        @warning: cache need to be cleared with clear_cache()
+    """
+    def load_cache(self, sql=None):
+        if not sql:
+            sql = Objects.sql
+        self._cache = {}
+        self._cache_sql = sql
+        result = sql.execute("SELECT name, rowid FROM artists\
+                              ORDER BY rowid")
+        for (name, artist_id) in result:
+            self._cache.setdefault(name, artist_id)
+
+    """
+        Reload cache if loaded, needed after artist deletion
+    """
+    def reload_cache(self, sql=None):
+        if self._cache is not None:
+            self.load_cache(sql)
+
+    """
+        Clear cache, get_id() will query db
+    """
+    def clear_cache(self):
+        self._cache = None
+        self._cache_sql = None
+
     """
         Get artist name
         @param Artist id as int
         @return Artist name as string
     """
+    @cached('name')
     def get_name(self, artist_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -130,19 +173,3 @@ class DatabaseArtists:
             return bool(v[0])
 
         return False
-
-    """
-        Search for artists looking like string
-        @param string
-        @return Array of id as int
-    """
-    def search(self, string, sql=None):
-        if not sql:
-            sql = Objects.sql
-        artists = []
-        result = sql.execute("SELECT rowid FROM artists\
-                              WHERE name LIKE ?\
-                              LIMIT 25", ('%'+string+'%',))
-        for row in result:
-            artists += row
-        return artists
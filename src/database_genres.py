@@ -20,18 +20,25 @@ from lollypop.define import Objects
 # set another one if you're in a thread
 class DatabaseGenres:
     def __init__(self):
-        pass
+        # Name to id cache used while scanning collection
+        self._cache = None
+        # Cursor cache was loaded with, only used with it
+        self._cache_sql = None
 
     """
         Add a new genre to database
         @param Name as string
+        @return genre id as int
         @warning: commit needed
     """
     def add(self, name, sql=None):
         if not sql:
             sql = Objects.sql
-        sql.execute("INSERT INTO genres (name) VALUES (?)",
-                    (name,))
+        result = sql.execute("INSERT INTO genres (name) VALUES (?)",
+                             (name,))
+        if self._cache is not None and sql is self._cache_sql:
+            self._cache.setdefault(name, result.lastrowid)
+        return result.lastrowid
 
     """
         Get genre id for name
@@ -41,6 +48,8 @@ class DatabaseGenres:
     def get_id(self, name, sql=None):
         if not sql:
             sql = Objects.sql
+        if self._cache is not None and sql is self._cache_sql:
+            return self._cache.get(name)
         result = sql.execute("SELECT rowid FROM genres\
                               WHERE name=?", (name,))
         v = result.fetchone()
@@ -49,6 +58,34 @@ class DatabaseGenres:
 
         return None
 
+    """
+        Load a name to id cache, get_id() with sql will not query db anymore
+        @warning: cache need to be cleared with clear_cache()
+    """
+    def load_cache(self, sql=None):
+        if not sql:
+            sql = Objects.sql
+        self._cache = {}
+        self._cache_sql = sql
+        result = sql.execute("SELECT name, rowid FROM genres\
+                              ORDER BY rowid")
+        for (name, genre_id) in result:
+            self._cache.setdefault(name, genre_id)
+
+    """
+        Reload cache if loaded, needed after genre deletion
+    """
+    def reload_cache(self, sql=None):
+        if self._cache is not None:
+            self.load_cache(sql)
+
+    """
+        Clear cache, get_id() will query db
+    """
+    def clear_cache(self):
+        self._cache = None
+        self._cache_sql = None
+
     """
         Get genre name for genre id
         @param string
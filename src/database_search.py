@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gettext import gettext as _
+
+from lollypop.define import Objects
+from lollypop.utils import normalize_name
+
+
+# Full text search index over albums and tracks
+# Albums are indexed with their name and album artist name,
+# tracks with their name and artists not being album artist,
+# names are indexed normalized, see utils::normalize_name()
+# All functions take a sqlite cursor as last parameter,
+# set another one if you're in a thread
+class DatabaseSearch:
+
+    # Max results for albums and for tracks
+    LIMIT = 25
+    # Ranking reads every match, only rank smaller results
+    RANK_MAX = 2000
+
+    """
+        Search index tables, rowids are album/track ids
+    """
+    TABLES = ["CREATE VIRTUAL TABLE IF NOT EXISTS search_albums\
+               USING fts5(name, artist, prefix='2 3')",
+              "CREATE VIRTUAL TABLE IF NOT EXISTS search_tracks\
+               USING fts5(name, artists, prefix='2 3')"]
+
+    def __init__(self):
+        pass
+
+    """
+        Search albums and tracks matching string, words are prefixes
+        Albums come first, best matches first
+        @param string as str
+        @return [(is track as bool, id as int, album id as int,
+                  title as string, artist names as [string],
+                  tracks count as int or -1)]
+    """
+    def get(self, string, sql=None):
+        if not sql:
+            sql = Objects.sql
+        words = normalize_name(string).split()
+        if not words:
+            return []
+        query = self._get_query(words)
+        albums_order = self._get_order("search_albums", query, sql)
+        tracks_order = self._get_order("search_tracks", query, sql)
+        items = []
+        result = sql.execute("SELECT * FROM\
+                                (SELECT 0, albums.rowid, albums.rowid,\
+                                 albums.name, artists.name,\
+                                 (SELECT COUNT(*) FROM tracks\
+                                  WHERE tracks.album_id=albums.rowid)\
+                                 FROM (SELECT rowid FROM search_albums\
+                                       WHERE search_albums MATCH ?1\
+                                       %s LIMIT ?2) AS matches\
+                                 JOIN albums\
+                                 ON albums.rowid=matches.rowid\
+                                 LEFT JOIN artists\
+                                 ON artists.rowid=albums.artist_id)\
+                              UNION ALL\
+                              SELECT * FROM\
+                                (SELECT 1, tracks.rowid, tracks.album_id,\
+                                 tracks.name,\
+                                 (SELECT GROUP_CONCAT(name, ';') FROM\
+                                    (SELECT name FROM artists\
+                                     WHERE rowid=albums.artist_id\
+                                     UNION ALL\
+                                     SELECT artists.name\
+                                     FROM track_artists, artists\
+                                     WHERE track_id=tracks.rowid\
+                                     AND artists.rowid=artist_id\
+                                     AND artist_id!=albums.artist_id)),\
+                                 -1\
+                                 FROM (SELECT rowid FROM search_tracks\
+                                       WHERE search_tracks MATCH ?1\
+                                       %s LIMIT ?2) AS matches\
+                                 JOIN tracks\
+                                 ON tracks.rowid=matches.rowid\
+                                 JOIN albums\
+                                 ON albums.rowid=tracks.album_id)" %
+                             (albums_order, tracks_order),
+                             (query, self.LIMIT))
+        for (is_track, object_id, album_id,
+             title, artists, count) in result:
+            if artists:
+                artists = artists.split(';')
+            elif is_track:
+                artists = []
+            else:
+                artists = [_("Many artists")]
+            items.append((bool(is_track), object_id, album_id,
+                          title, artists, count))
+        return items
+
+    """
+        Update index for albums and their tracks
+        @param album ids as set of int
+        @warning commit needed
+    """
+    def update(self, album_ids, sql=None):
+        if not sql:
+            sql = Objects.sql
+        album_ids = [(album_id,) for album_id in album_ids]
+        sql.executemany("DELETE FROM search_albums WHERE rowid=?", album_ids)
+        sql.executemany("DELETE FROM search_tracks WHERE rowid IN\
+                            (SELECT rowid FROM tracks WHERE album_id=?)",
+                        album_ids)
+        sql.executemany("INSERT INTO search_albums (rowid, name, artist)\
+                         SELECT albums.rowid, albums.search_name,\
+                         artists.search_name\
+                         FROM albums LEFT JOIN artists\
+                         ON artists.rowid=albums.artist_id\
+                         WHERE albums.rowid=?", album_ids)
+        sql.executemany("INSERT INTO search_tracks (rowid, name, artists)\
+                         SELECT tracks.rowid, tracks.search_name,\
+                         (SELECT GROUP_CONCAT(artists.search_name, ' ')\
+                          FROM track_artists, artists\
+                          WHERE track_artists.track_id=tracks.rowid\
+                          AND artists.rowid=track_artists.artist_id\
+                          AND artists.rowid!=albums.artist_id)\
+                         FROM tracks, albums\
+                         WHERE tracks.album_id=?\
+                         AND albums.rowid=tracks.album_id", album_ids)
+
+    """
+        Rebuild whole index
+        @warning commit needed
+    """
+    def rebuild(self, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.execute("DELETE FROM search_albums")
+        sql.execute("DELETE FROM search_tracks")
+        sql.execute("INSERT INTO search_albums (rowid, name, artist)\
+                     SELECT albums.rowid, albums.search_name,\
+                     artists.search_name\
+                     FROM albums LEFT JOIN artists\
+                     ON artists.rowid=albums.artist_id")
+        sql.execute("INSERT INTO search_tracks (rowid, name, artists)\
+                     SELECT tracks.rowid, tracks.search_name,\
+                     (SELECT GROUP_CONCAT(artists.search_name, ' ')\
+                      FROM track_artists, artists\
+                      WHERE track_artists.track_id=tracks.rowid\
+                      AND artists.rowid=track_artists.artist_id\
+                      AND artists.rowid!=albums.artist_id)\
+                     FROM tracks, albums\
+                     WHERE albums.rowid=tracks.album_id")
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Get fts query matching all words as prefixes
+        @param words as [str]
+        @return query as str
+    """
+    def _get_query(self, words):
+        prefixes = []
+        for word in words:
+            prefixes.append('"%s"*' % word.replace('"', '""'))
+        return " ".join(prefixes)
+
+    """
+        Get order clause for query on table, best matches first
+        if there is not too many matches
+        @param table as str
+        @param query as str
+        @return order clause as str
+    """
+    def _get_order(self, table, query, sql):
+        result = sql.execute("SELECT COUNT(*) FROM\
+                                (SELECT rowid FROM %s WHERE %s MATCH ?\
+                                 LIMIT ?)" % (table, table),
+                             (query, self.RANK_MAX + 1))
+        if result.fetchone()[0] > self.RANK_MAX:
+            return ""
+        return "ORDER BY rank"
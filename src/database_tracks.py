@@ -14,13 +14,47 @@
 from gettext import gettext as _
 
 from lollypop.define import Objects, Navigation
+from lollypop.utils import normalize_name
+from lollypop.lrucache import LRUCache, cached
+
+
+# Track fields needed for playback, see DatabaseTracks::get_record()
+class TrackRecord:
+    """
+        @param track id as int
+        @param name as string
+        @param album id as int
+        @param album name as string
+        @param album artist id as int
+        @param album artist name as string
+        @param artist names as [string]
+        @param genre name as string "genre1 genre2 ..."
+        @param length as int
+        @param number as int
+        @param path as string
+    """
+    def __init__(self, track_id, name, album_id, album_name, aartist_id,
+                 aartist_name, artist_names, genre_name, length, number,
+                 path):
+        self.id = track_id
+        self.name = name
+        self.album_id = album_id
+        self.album_name = album_name
+        self.aartist_id = aartist_id
+        self.aartist_name = aartist_name
+        self.artist_names = artist_names
+        self.genre_name = genre_name
+        self.length = length
+        self.number = number
+        self.path = path
 
 
 # All functions take a sqlite cursor as last parameter,
 # set another one if you're in a thread
 class DatabaseTracks:
     def __init__(self):
-        pass
+        # Scalar getters cache, scanner invalidates it
+        self.lru = LRUCache(5000)
 
     """
         Add a new track to database
@@ -33,6 +67,7 @@ class DatabaseTracks:
         @param genre_id as int
         @param year as int
         @param mtime as int
+        @return track id as int, None on error
         @warning: commit needed
     """
     def add(self, name, filepath, length, tracknumber, discnumber,
@@ -41,19 +76,55 @@ class DatabaseTracks:
             sql = Objects.sql
         # Invalid encoding in filenames may raise an exception
         try:
-            sql.execute(
+            result = sql.execute(
                 "INSERT INTO tracks (name, filepath, length, tracknumber,\
-                discnumber, album_id, year, mtime) VALUES\
-                (?, ?, ?, ?, ?, ?, ?, ?)", (name,
-                                            filepath,
-                                            length,
-                                            tracknumber,
-                                            discnumber,
-                                            album_id,
-                                            year,
-                                            mtime))
+                discnumber, album_id, year, mtime, search_name) VALUES\
+                (?, ?, ?, ?, ?, ?, ?, ?, ?)", (name,
+                                               filepath,
+                                               length,
+                                               tracknumber,
+                                               discnumber,
+                                               album_id,
+                                               year,
+                                               mtime,
+                                               normalize_name(name)))
+            # Rowid may be reused from a removed track
+            self.lru.remove([result.lastrowid])
+            return result.lastrowid
         except Exception as e:
             print("DatabaseTracks::add: ", e, ascii(filepath))
+            return None
+
+    """
+        Add new tracks to database
+        @param tracks as [(name as string, filepath as string,
+                           length as int, tracknumber as int,
+                           discnumber as int, album_id as int,
+                           year as int, mtime as int)]
+        @return track ids as [int], None for tracks not added
+        @warning: commit needed
+    """
+    def add_many(self, tracks, sql=None):
+        if not sql:
+            sql = Objects.sql
+        track_ids = []
+        for track in tracks:
+            # Invalid encoding in filenames may raise an exception
+            try:
+                result = sql.execute(
+                    "INSERT INTO tracks (name, filepath, length, tracknumber,\
+                    discnumber, album_id, year, mtime, search_name) VALUES\
+                    (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    track + (normalize_name(track[0]),))
+                # Other writers may insert rows meanwhile, use our rowid
+                track_ids.append(result.lastrowid)
+            except Exception as e:
+                print("DatabaseTracks::add_many: ", e, ascii(track[1]))
+                track_ids.append(None)
+        # Rowids may be reused from removed tracks
+        self.lru.remove([track_id for track_id in track_ids
+                         if track_id is not None])
+        return track_ids
 
     """
         Add artist to track
@@ -83,6 +154,28 @@ class DatabaseTracks:
             sql.execute("INSERT INTO track_genres (track_id, genre_id)"
                         "VALUES (?, ?)", (track_id, genre_id))
 
+    """
+        Add artists to new tracks
+        @param track artists as [(track id as int, artist id as int)]
+        @warning: commit needed
+    """
+    def add_artists(self, track_artists, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.executemany("INSERT INTO track_artists (track_id, artist_id)"
+                        "VALUES (?, ?)", track_artists)
+
+    """
+        Add genres to new tracks
+        @param track genres as [(track id as int, genre id as int)]
+        @warning: commit needed
+    """
+    def add_genres(self, track_genres, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.executemany("INSERT INTO track_genres (track_id, genre_id)"
+                        "VALUES (?, ?)", track_genres)
+
     """
         Return track id for path
         @param filepath as str
@@ -103,6 +196,7 @@ class DatabaseTracks:
         @param Track id as int
         @return Name as string
     """
+    @cached('name')
     def get_name(self, track_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -119,6 +213,7 @@ class DatabaseTracks:
         @param track id as int
         @return track year as string
     """
+    @cached('year')
     def get_year(self, album_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -136,6 +231,7 @@ class DatabaseTracks:
         @param Track id as int
         @return Path as string
     """
+    @cached('path')
     def get_path(self, track_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -152,6 +248,7 @@ class DatabaseTracks:
         @param track id as int
         @return album id as int
     """
+    @cached('album_id')
     def get_album_id(self, track_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -210,6 +307,22 @@ class DatabaseTracks:
             genres += row
         return genres
 
+    """
+        Get track mtime
+        @param filepath as string
+        @return mtime as int, None if track doesn't exist
+    """
+    def get_mtime(self, filepath, sql=None):
+        if not sql:
+            sql = Objects.sql
+        result = sql.execute("SELECT mtime FROM tracks WHERE filepath=?",
+                             (filepath,))
+        v = result.fetchone()
+        if v and len(v) > 0:
+            return v[0]
+
+        return None
+
     """
         Get mtime for tracks
         WARNING: Should be called before anything is shown on screen
@@ -227,6 +340,52 @@ class DatabaseTracks:
         sql.row_factory = None
         return mtimes
 
+    """
+        Get mtime for directories containing tracks
+        @param None
+        @return dict of {path as string: mtime as int}
+    """
+    def get_dir_mtimes(self, sql=None):
+        if not sql:
+            sql = Objects.sql
+        result = sql.execute("SELECT path, mtime FROM directories")
+        return dict(result.fetchall())
+
+    """
+        Set mtime for directories, replace previous ones
+        @param mtimes as {path as string: mtime as int}
+        @warning: commit needed
+    """
+    def set_dir_mtimes(self, mtimes, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.execute("DELETE FROM directories")
+        sql.executemany("INSERT INTO directories (path, mtime)\
+                         VALUES (?, ?)", mtimes.items())
+
+    """
+        Update mtime for directories, keep other ones
+        @param mtimes as {path as string: mtime as int}
+        @warning: commit needed
+    """
+    def update_dir_mtimes(self, mtimes, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.executemany("INSERT OR REPLACE INTO directories (path, mtime)\
+                         VALUES (?, ?)", mtimes.items())
+
+    """
+        Remove mtime for directories and their subdirectories
+        @param paths as [string]
+        @warning: commit needed
+    """
+    def remove_dir_mtimes(self, paths, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.executemany("DELETE FROM directories\
+                         WHERE path=?1 OR substr(path, 1, length(?2))=?2",
+                        [(path, path + "/") for path in paths])
+
     """
         Get all track informations for track id
         @param Track id as int
@@ -244,6 +403,51 @@ class DatabaseTracks:
             return v
         return ()
 
+    """
+        Get playback fields for track, in one query
+        @param track id as int
+        @return TrackRecord
+    """
+    def get_record(self, track_id, sql=None):
+        if not sql:
+            sql = Objects.sql
+        result = sql.execute("SELECT tracks.name, tracks.album_id,\
+                              albums.name, albums.artist_id, artists.name,\
+                              (SELECT GROUP_CONCAT(artists.name, ';')\
+                               FROM track_artists, artists\
+                               WHERE track_artists.track_id=tracks.rowid\
+                               AND artists.rowid=track_artists.artist_id),\
+                              (SELECT GROUP_CONCAT(genres.name, ' ')\
+                               FROM album_genres, genres\
+                               WHERE album_genres.album_id=tracks.album_id\
+                               AND genres.rowid=album_genres.genre_id),\
+                              tracks.length, tracks.tracknumber,\
+                              tracks.filepath\
+                              FROM tracks LEFT JOIN albums\
+                              ON albums.rowid=tracks.album_id\
+                              LEFT JOIN artists\
+                              ON artists.rowid=albums.artist_id\
+                              WHERE tracks.rowid=?", (track_id,))
+        v = result.fetchone()
+        if v is None:
+            return TrackRecord(track_id, "", -1, _("Unknown"),
+                               Navigation.COMPILATIONS, _("Many artists"),
+                               [], "", 0, 0, "")
+        (name, album_id, album_name, aartist_id, aartist_name,
+         artist_names, genre_name, length, number, path) = v
+        if album_name is None:
+            album_name = _("Unknown")
+            aartist_id = Navigation.COMPILATIONS
+        if aartist_id == Navigation.COMPILATIONS:
+            aartist_name = _("Many artists")
+        elif aartist_name is None:
+            aartist_name = _("Unknown")
+        return TrackRecord(track_id, name, album_id, album_name,
+                           aartist_id, aartist_name,
+                           artist_names.split(';') if artist_names else [],
+                           genre_name + " " if genre_name else "",
+                           length, number, path)
+
     """
         Get aartist id for track id
         @param Track id as int
@@ -277,11 +481,30 @@ class DatabaseTracks:
             tracks += row
         return tracks
 
+    """
+        Get tracks filepath for path
+        @param path as string, a file or a directory
+        @return Array of filepath as string
+    """
+    def get_paths_in(self, path, sql=None):
+        if not sql:
+            sql = Objects.sql
+        tracks = []
+        # '0' follows '/', so this is a range on filepath index
+        result = sql.execute("SELECT filepath FROM tracks\
+                              WHERE filepath=?\
+                              OR (filepath>=? AND filepath<?)",
+                             (path, path + "/", path + "0"))
+        for row in result:
+            tracks += row
+        return tracks
+
     """
         Get track position in album
         @param track id as int
         @return position as int
     """
+    @cached('number')
     def get_number(self, track_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -298,6 +521,7 @@ class DatabaseTracks:
         @param Track id as int
         @return length as int
     """
+    @cached('length')
     def get_length(self, track_id, sql=None):
         if not sql:
             sql = Objects.sql
@@ -309,6 +533,46 @@ class DatabaseTracks:
 
         return 0
 
+    """
+        Add plays and skips to tracks statistics
+        @param stats as [(filepath as str, plays as int, skips as int,
+                          last played as int (seconds since epoch) or None)]
+        @warning: commit needed
+    """
+    def add_stats(self, stats, sql=None):
+        if not sql:
+            sql = Objects.sql
+        sql.executemany("INSERT OR IGNORE INTO track_stats\
+                         (filepath, playcount, skipcount)\
+                         VALUES (?, 0, 0)",
+                        [(filepath,) for (filepath, plays, skips, last)
+                         in stats])
+        sql.executemany("UPDATE track_stats\
+                         SET playcount=playcount+?1,\
+                             skipcount=skipcount+?2,\
+                             lastplayed=IFNULL(MAX(lastplayed, ?3),\
+                                               IFNULL(lastplayed, ?3))\
+                         WHERE filepath=?4",
+                        [(plays, skips, last, filepath)
+                         for (filepath, plays, skips, last) in stats])
+
+    """
+        Get track statistics
+        @param filepath as str
+        @return (play count as int, skip count as int,
+                 last played as int or None)
+    """
+    def get_stats(self, filepath, sql=None):
+        if not sql:
+            sql = Objects.sql
+        result = sql.execute("SELECT playcount, skipcount, lastplayed\
+                              FROM track_stats WHERE filepath=?",
+                             (filepath,))
+        v = result.fetchone()
+        if v is not None:
+            return v
+        return (0, 0, None)
+
     """
         Return True if no tracks in db
     """
@@ -322,34 +586,18 @@ class DatabaseTracks:
 
         return True
 
-    """
-        Get tracks for artist_id where artist_id isn't main artist
-        @param artist id as int
-        @return array of (tracks id as int, track name as string)
-    """
-    def get_as_non_aartist(self, artist_id, sql=None):
-        if not sql:
-            sql = Objects.sql
-        tracks = []
-        result = sql.execute("SELECT tracks.rowid, tracks.name\
-                              FROM tracks, track_artists, albums\
-                              WHERE albums.rowid == tracks.album_id\
-                              AND track_artists.artist_id=?\
-                              AND track_artists.track_id=tracks.rowid\
-                              AND albums.artist_id != ?", (artist_id,
-                                                           artist_id))
-        for row in result:
-            tracks += (row,)
-        return tracks
-
     """
         Remove temp tracks for db (ie with mtime=0)
     """
     def remove_tmp(self, sql=None):
         if not sql:
             sql = Objects.sql
+        sql.execute("DELETE FROM search_tracks\
+                     WHERE rowid IN (SELECT rowid FROM tracks\
+                                     WHERE mtime=0)")
         sql.execute("DELETE FROM tracks\
                      WHERE mtime=0")
+        self.lru.clear()
         sql.commit()
 
     """
@@ -378,13 +626,14 @@ class DatabaseTracks:
                      WHERE NOT EXISTS\
                         (SELECT rowid FROM tracks\
                          WHERE track_genres.track_id = tracks.rowid)")
+        # Unary + keeps sqlite from looking up every track of genre
         sql.execute("DELETE FROM album_genres\
                      WHERE NOT EXISTS\
                         (SELECT tracks.rowid\
                          FROM tracks, track_genres\
-                         WHERE track_genres.genre_id = album_genres.genre_id\
+                         WHERE album_genres.album_id = tracks.album_id\
                          AND tracks.rowid = track_genres.track_id\
-                         AND album_genres.album_id = tracks.album_id)")
+                         AND +track_genres.genre_id = album_genres.genre_id)")
         sql.execute("DELETE FROM genres\
                      WHERE NOT EXISTS\
                         (SELECT rowid FROM album_genres\
@@ -392,21 +641,76 @@ class DatabaseTracks:
                      AND NOT EXISTS\
                         (SELECT rowid FROM track_genres\
                          WHERE genres.rowid = track_genres.genre_id)")
-
-    """
-        Search for tracks looking like string
-        @param string
-        return: Arrays of (id as int, name as string)
+        # Deleted entries may be cached
+        Objects.albums.reload_cache(sql)
+        Objects.albums.lru.clear()
+        Objects.artists.reload_cache(sql)
+        Objects.artists.lru.clear()
+        Objects.genres.reload_cache(sql)
+
+    """
+        Clean database deleting orphaned entries, only check given ids,
+        use clean() to check whole database
+        @param album ids as set of int
+        @param artist ids as set of int
+        @param genre ids as set of int
+        @warning commit needed
     """
-    def search(self, string, sql=None):
+    def clean_ids(self, album_ids, artist_ids, genre_ids, sql=None):
         if not sql:
             sql = Objects.sql
-        tracks = []
-        result = sql.execute("SELECT rowid, name FROM tracks\
-                              WHERE name LIKE ? LIMIT 25", ('%'+string+'%',))
-        for row in result:
-            tracks += (row,)
-        return tracks
+        artist_ids = set(artist_ids)
+        orphans = []
+        for album_id in album_ids:
+            result = sql.execute("SELECT artist_id FROM albums\
+                                  WHERE rowid=?\
+                                  AND NOT EXISTS\
+                                    (SELECT rowid FROM tracks\
+                                     WHERE tracks.album_id=albums.rowid)",
+                                 (album_id,))
+            v = result.fetchone()
+            if v is not None:
+                # Album artist may be orphaned too
+                artist_ids.add(v[0])
+                orphans.append((album_id,))
+        sql.executemany("DELETE FROM albums WHERE rowid=?", orphans)
+        if orphans:
+            Objects.albums.reload_cache(sql)
+            Objects.albums.lru.remove([album_id for (album_id,) in orphans])
+        # Unary + keeps sqlite from looking up every track of genre
+        sql.executemany("DELETE FROM album_genres\
+                         WHERE album_id=?\
+                         AND NOT EXISTS\
+                            (SELECT tracks.rowid\
+                             FROM tracks, track_genres\
+                             WHERE tracks.album_id=album_genres.album_id\
+                             AND tracks.rowid=track_genres.track_id\
+                             AND +track_genres.genre_id=\
+                                 album_genres.genre_id)",
+                        [(album_id,) for album_id in album_ids])
+        result = sql.executemany("DELETE FROM artists\
+                                  WHERE rowid=?1\
+                                  AND NOT EXISTS\
+                                    (SELECT rowid FROM track_artists\
+                                     WHERE track_artists.artist_id=?1)\
+                                  AND NOT EXISTS\
+                                    (SELECT rowid FROM albums\
+                                     WHERE albums.artist_id=?1)",
+                                 [(artist_id,) for artist_id in artist_ids])
+        if result.rowcount > 0:
+            Objects.artists.reload_cache(sql)
+            Objects.artists.lru.remove(artist_ids)
+        result = sql.executemany("DELETE FROM genres\
+                                  WHERE rowid=?1\
+                                  AND NOT EXISTS\
+                                    (SELECT rowid FROM album_genres\
+                                     WHERE album_genres.genre_id=?1)\
+                                  AND NOT EXISTS\
+                                    (SELECT rowid FROM track_genres\
+                                     WHERE track_genres.genre_id=?1)",
+                                 [(genre_id,) for genre_id in genre_ids])
+        if result.rowcount > 0:
+            Objects.genres.reload_cache(sql)
 
     """
         Remove track
@@ -420,8 +724,64 @@ class DatabaseTracks:
                      WHERE track_id=?", (track_id,))
         sql.execute("DELETE FROM track_artists\
                      WHERE track_id=?", (track_id,))
+        sql.execute("DELETE FROM search_tracks\
+                     WHERE rowid=?", (track_id,))
         sql.execute("DELETE FROM tracks\
                      WHERE rowid=?", (track_id,))
+        self.lru.remove([track_id])
+
+    """
+        Remove tracks
+        @param Tracks path as [string]
+        @return (album ids as set, artist ids as set, genre ids as set)
+                of removed tracks
+        @warning commit needed
+    """
+    def remove_many(self, paths, sql=None):
+        if not sql:
+            sql = Objects.sql
+        album_ids = set()
+        artist_ids = set()
+        genre_ids = set()
+        if not paths:
+            return (album_ids, artist_ids, genre_ids)
+        sql.execute("CREATE TEMP TABLE IF NOT EXISTS removed\
+                     (filepath TEXT PRIMARY KEY)")
+        sql.execute("DELETE FROM removed")
+        sql.executemany("INSERT OR IGNORE INTO removed VALUES (?)",
+                        [(path,) for path in paths])
+        result = sql.execute("SELECT DISTINCT album_id FROM tracks\
+                              WHERE filepath IN\
+                                (SELECT filepath FROM removed)")
+        for row in result:
+            album_ids.add(row[0])
+        result = sql.execute("SELECT DISTINCT artist_id\
+                              FROM tracks, removed, track_artists\
+                              WHERE tracks.filepath=removed.filepath\
+                              AND track_artists.track_id=tracks.rowid")
+        for row in result:
+            artist_ids.add(row[0])
+        result = sql.execute("SELECT DISTINCT genre_id\
+                              FROM tracks, removed, track_genres\
+                              WHERE tracks.filepath=removed.filepath\
+                              AND track_genres.track_id=tracks.rowid")
+        for row in result:
+            genre_ids.add(row[0])
+        for table in ["track_genres", "track_artists"]:
+            sql.execute("DELETE FROM %s\
+                         WHERE track_id IN\
+                            (SELECT tracks.rowid FROM tracks, removed\
+                             WHERE tracks.filepath=removed.filepath)"
+                        % table)
+        sql.execute("DELETE FROM search_tracks\
+                     WHERE rowid IN\
+                        (SELECT tracks.rowid FROM tracks, removed\
+                         WHERE tracks.filepath=removed.filepath)")
+        sql.execute("DELETE FROM tracks\
+                     WHERE filepath IN (SELECT filepath FROM removed)")
+        sql.execute("DELETE FROM removed")
+        self.lru.clear()
+        return (album_ids, artist_ids, genre_ids)
 
 #######################
 # PRIVATE             #
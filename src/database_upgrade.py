@@ -0,0 +1,223 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from lollypop.database_search import DatabaseSearch
+from lollypop.utils import normalize_name
+
+
+# Upgrade database schema in place, without a rescan
+class DatabaseUpgrade:
+
+    """
+        Tables at schema version 5, older databases are copied into them
+        Columns added by later versions are kept, so replaying upgrades
+        on a newer database does not drop them
+    """
+    TABLES_5 = {'albums': "CREATE TABLE albums (id INTEGER PRIMARY KEY,\
+                                               name TEXT NOT NULL,\
+                                               artist_id INT NOT NULL,\
+                                               year INT,\
+                                               path TEXT NOT NULL,\
+                                               popularity INT NOT NULL,\
+                                               search_name TEXT)",
+                'artists': "CREATE TABLE artists (id INTEGER PRIMARY KEY,\
+                                                 name TEXT NOT NULL,\
+                                                 search_name TEXT)",
+                'genres': "CREATE TABLE genres (id INTEGER PRIMARY KEY,\
+                                               name TEXT NOT NULL)",
+                'album_genres': "CREATE TABLE album_genres (\
+                                                album_id INT NOT NULL,\
+                                                genre_id INT NOT NULL)",
+                'tracks': "CREATE TABLE tracks (id INTEGER PRIMARY KEY,\
+                                               name TEXT NOT NULL,\
+                                               filepath TEXT NOT NULL,\
+                                               length REAL,\
+                                               tracknumber INT,\
+                                               discnumber INT,\
+                                               album_id INT NOT NULL,\
+                                               year INT,\
+                                               mtime INT,\
+                                               search_name TEXT)",
+                'track_artists': "CREATE TABLE track_artists (\
+                                                track_id INT NOT NULL,\
+                                                artist_id INT NOT NULL)",
+                'track_genres': "CREATE TABLE track_genres (\
+                                                track_id INT NOT NULL,\
+                                                genre_id INT NOT NULL)"}
+
+    """
+        Indexes for hot queries, also used at db creation
+    """
+    INDEXES = ["CREATE INDEX IF NOT EXISTS idx_tracks_filepath\
+                ON tracks(filepath)",
+               "CREATE INDEX IF NOT EXISTS idx_tracks_album_id\
+                ON tracks(album_id)",
+               "CREATE INDEX IF NOT EXISTS idx_track_artists_track_id\
+                ON track_artists(track_id)",
+               "CREATE INDEX IF NOT EXISTS idx_track_artists_artist_id\
+                ON track_artists(artist_id)",
+               "CREATE INDEX IF NOT EXISTS idx_track_genres_track_id\
+                ON track_genres(track_id)",
+               "CREATE INDEX IF NOT EXISTS idx_track_genres_genre_id\
+                ON track_genres(genre_id)",
+               "CREATE INDEX IF NOT EXISTS idx_album_genres_album_id\
+                ON album_genres(album_id)",
+               "CREATE INDEX IF NOT EXISTS idx_album_genres_genre_id\
+                ON album_genres(genre_id)",
+               "CREATE INDEX IF NOT EXISTS idx_albums_name_artist_id\
+                ON albums(name, artist_id)",
+               "CREATE INDEX IF NOT EXISTS idx_albums_artist_id\
+                ON albums(artist_id)",
+               "CREATE INDEX IF NOT EXISTS idx_artists_name\
+                ON artists(name)",
+               "CREATE INDEX IF NOT EXISTS idx_genres_name\
+                ON genres(name)"]
+
+    """
+        @param db version as int, current schema version
+        @param sql as sqlite cursor
+    """
+    def __init__(self, version, sql):
+        self._version = version
+        self._sql = sql
+        # Schema version: sql statements or method doing upgrade
+        self._UPGRADES = {
+            5: self._upgrade_5,
+            6: self.INDEXES,
+            7: ["CREATE TABLE IF NOT EXISTS directories (\
+                                            path TEXT PRIMARY KEY,\
+                                            mtime INT NOT NULL)"],
+            8: DatabaseSearch.TABLES,
+            9: self._upgrade_9,
+            10: ["CREATE TABLE IF NOT EXISTS track_stats (\
+                                            filepath TEXT PRIMARY KEY,\
+                                            playcount INT NOT NULL,\
+                                            skipcount INT NOT NULL,\
+                                            lastplayed INT)"],
+            11: self._upgrade_11
+        }
+
+    """
+        Return last schema version
+        @return int
+    """
+    def get_version(self):
+        return max(self._UPGRADES.keys())
+
+    """
+        Upgrade database to last schema version, all upgrades run in one
+        transaction, on failure database is left unchanged
+        @return upgraded version as int
+        @raise Exception if an upgrade failed
+    """
+    def do_db_upgrade(self):
+        version = self._version
+        i = version
+        # DDL statements are part of the transaction
+        self._sql.execute("BEGIN")
+        try:
+            for i in sorted(self._UPGRADES.keys()):
+                if i <= self._version:
+                    continue
+                upgrade = self._UPGRADES[i]
+                if isinstance(upgrade, list):
+                    for request in upgrade:
+                        self._sql.execute(request)
+                else:
+                    upgrade()
+                version = i
+            self._sql.commit()
+        except Exception as e:
+            print("DatabaseUpgrade::do_db_upgrade(%s): %s" % (i, e))
+            self._sql.rollback()
+            raise
+        return version
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Copy tables from older schemas, keeping ids and popularities
+    """
+    def _upgrade_5(self):
+        for table in sorted(self.TABLES_5.keys()):
+            self._copy_table(table, self.TABLES_5[table])
+
+    """
+        Add normalized names for search and rebuild search index
+    """
+    def _upgrade_9(self):
+        for table in ["albums", "artists", "tracks"]:
+            result = self._sql.execute("PRAGMA table_info(%s)" % table)
+            if "search_name" not in [row[1] for row in result]:
+                self._sql.execute("ALTER TABLE %s ADD COLUMN search_name TEXT"
+                                  % table)
+            result = self._sql.execute("SELECT rowid, name FROM %s" % table)
+            self._sql.executemany("UPDATE %s SET search_name=?\
+                                   WHERE rowid=?" % table,
+                                  [(normalize_name(name), rowid)
+                                   for (rowid, name) in result.fetchall()])
+        DatabaseSearch().rebuild(self._sql)
+
+    """
+        Store tracks mtimes in nanoseconds, like directories mtimes,
+        so files not modified since last scan are not read again
+    """
+    def _upgrade_11(self):
+        result = self._sql.execute("SELECT rowid, filepath, mtime\
+                                    FROM tracks")
+        mtimes = []
+        for (track_id, filepath, mtime) in result.fetchall():
+            try:
+                stat = os.stat(filepath)
+                if int(stat.st_mtime) == mtime:
+                    mtimes.append((stat.st_mtime_ns, track_id))
+            except:
+                pass
+        self._sql.executemany("UPDATE tracks SET mtime=? WHERE rowid=?",
+                              mtimes)
+
+    """
+        Recreate table with statement and copy rows from previous table,
+        columns missing in previous table are set to an empty value
+        @param table as str
+        @param create as str, sql statement creating table
+    """
+    def _copy_table(self, table, create):
+        result = self._sql.execute("PRAGMA table_info(%s)" % table)
+        old_columns = [row[1] for row in result]
+        if not old_columns:
+            self._sql.execute(create)
+            return
+        self._sql.execute("ALTER TABLE %s RENAME TO %s_old" % (table, table))
+        self._sql.execute(create)
+        columns = []
+        values = []
+        result = self._sql.execute("PRAGMA table_info(%s)" % table)
+        for (cid, name, sqltype, notnull, default, pk) in result.fetchall():
+            # Keep ids, they are used by other tables
+            if pk:
+                columns.append(name)
+                values.append("rowid")
+            elif name in old_columns:
+                columns.append(name)
+                values.append(name)
+            elif notnull:
+                columns.append(name)
+                values.append("''" if sqltype == "TEXT" else "0")
+        self._sql.execute("INSERT INTO %s (%s) SELECT %s FROM %s_old" %
+                          (table, ", ".join(columns), ", ".join(values),
+                           table))
+        self._sql.execute("DROP TABLE %s_old" % table)
@@ -26,6 +26,9 @@ class Objects_:
     playlists = None
     player = None
     art = None
+    tagcache = None
+    search = None
+    playstats = None
 
 
 # Represent what to do on next track
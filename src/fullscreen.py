@@ -168,7 +168,7 @@ class FullScreen(Gtk.Window):
         @param widget as Gtk.Button
     """
     def _on_next_btn_clicked(self, widget):
-        Objects.player.next()
+        Objects.player.next(skip=True)
 
     """
         Update buttons and progress bar
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from _thread import allocate_lock
+
+
+# Bounded cache of objects fields, least recently used objects are dropped
+# Safe to use from any thread
+class LRUCache:
+
+    """
+        @param size as int, max objects in cache
+    """
+    def __init__(self, size):
+        self.hits = 0
+        self.misses = 0
+        self._size = size
+        self._objects = OrderedDict()
+        # Changed on each invalidation
+        self._generation = 0
+        self._lock = allocate_lock()
+
+    """
+        Get object field
+        @param object id as int
+        @param field as str
+        @return (found as bool, value)
+    """
+    def get(self, object_id, field):
+        with self._lock:
+            fields = self._objects.get(object_id)
+            if fields is not None and field in fields:
+                self._objects.move_to_end(object_id)
+                self.hits += 1
+                return (True, fields[field])
+            self.misses += 1
+            return (False, None)
+
+    """
+        Get current generation, to give to set()
+        @return int
+    """
+    def get_generation(self):
+        return self._generation
+
+    """
+        Set object field, ignored if cache was invalidated since generation
+        @param object id as int
+        @param field as str
+        @param value as object
+        @param generation as int, see get_generation()
+    """
+    def set(self, object_id, field, value, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            fields = self._objects.get(object_id)
+            if fields is None:
+                fields = {}
+                self._objects[object_id] = fields
+                if len(self._objects) > self._size:
+                    self._objects.popitem(last=False)
+            else:
+                self._objects.move_to_end(object_id)
+            fields[field] = value
+
+    """
+        Remove objects
+        @param object ids as [int]
+    """
+    def remove(self, object_ids):
+        with self._lock:
+            self._generation += 1
+            for object_id in object_ids:
+                self._objects.pop(object_id, None)
+
+    """
+        Remove all objects
+    """
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._objects.clear()
+
+
+"""
+    Cache getter(self, object id, sql=None) results in self.lru
+    @param field as str
+"""
+
+
+def cached(field):
+    def decorator(getter):
+        def wrapper(self, object_id, sql=None):
+            (found, value) = self.lru.get(object_id, field)
+            if not found:
+                generation = self.lru.get_generation()
+                value = getter(self, object_id, sql)
+                self.lru.set(object_id, field, value, generation)
+            return value
+        return wrapper
+    return decorator
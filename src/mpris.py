@@ -47,7 +47,7 @@ class MPRIS(dbus.service.Object):
 
     @dbus.service.method(dbus_interface=MPRIS_PLAYER_IFACE)
     def Next(self):
-        Objects.player.next()
+        Objects.player.next(skip=True)
 
     @dbus.service.method(dbus_interface=MPRIS_PLAYER_IFACE)
     def Previous(self):
@@ -89,4 +89,4 @@ class NotificationManager:
         Callback for notification next button
     """
     def _go_next(self, notification, action, data):
-        Objects.player.next()
+        Objects.player.next(skip=True)
@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+
+from lollypop.define import Objects
+
+
+# Albums tracks in playback order
+# A track is found by album id and position in album
+# Album tracks are loaded on first use and kept until clear_tracks(),
+# albums without tracks are skipped
+class PlaybackOrder:
+    def __init__(self):
+        self.set_albums([], None)
+
+    """
+        Set albums, tracks are loaded when needed
+        @param album ids as [int]
+        @param genre id as int, only tracks from genre
+    """
+    def set_albums(self, album_ids, genre_id):
+        self._genre_id = genre_id
+        # Album id to tracks ids
+        self._tracks = {}
+        self.set_order(album_ids)
+
+    """
+        Change albums order, loaded tracks are kept
+        @param album ids as [int]
+    """
+    def set_order(self, album_ids):
+        # Album ids by album index
+        self._albums = array('q')
+        # Album id to album index
+        self._indexes = {}
+        for album_id in album_ids:
+            if album_id not in self._indexes:
+                self._indexes[album_id] = len(self._albums)
+                self._albums.append(album_id)
+
+    """
+        Forget loaded tracks, collection changed
+    """
+    def clear_tracks(self):
+        self._tracks = {}
+
+    """
+        Get track position in album
+        @param album id as int
+        @param track id as int
+        @return position as int
+        @raise ValueError if track not in album
+    """
+    def get_position(self, album_id, track_id):
+        return self._get_tracks(album_id).index(track_id)
+
+    """
+        Get track after position in album, first album follows last one
+        @param album id as int
+        @param position as int
+        @param sqlite cursor as sql if running in a thread
+        @return (album id as int, position as int, track id as int),
+                None if no tracks
+    """
+    def get_next(self, album_id, position, sql=None):
+        tracks = self._get_tracks(album_id, sql)
+        if position + 1 < len(tracks):
+            return (album_id, position + 1, tracks[position + 1])
+        index = self._indexes.get(album_id, -1)
+        for i in range(len(self._albums)):
+            index = (index + 1) % len(self._albums)
+            tracks = self._get_tracks(self._albums[index], sql)
+            if tracks:
+                return (self._albums[index], 0, tracks[0])
+        return None
+
+    """
+        Get track before position in album, last album precedes first one
+        @param album id as int
+        @param position as int
+        @param sqlite cursor as sql if running in a thread
+        @return (album id as int, position as int, track id as int),
+                None if no tracks
+    """
+    def get_prev(self, album_id, position, sql=None):
+        tracks = self._get_tracks(album_id, sql)
+        if 0 < position <= len(tracks):
+            return (album_id, position - 1, tracks[position - 1])
+        index = self._indexes.get(album_id, 0)
+        for i in range(len(self._albums)):
+            index = (index - 1) % len(self._albums)
+            tracks = self._get_tracks(self._albums[index], sql)
+            if tracks:
+                return (self._albums[index], len(tracks) - 1, tracks[-1])
+        return None
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Get album tracks, load them if needed
+        @param album id as int
+        @param sqlite cursor as sql if running in a thread
+        @return track ids as array
+    """
+    def _get_tracks(self, album_id, sql=None):
+        tracks = self._tracks.get(album_id)
+        if tracks is None:
+            tracks = array('q', Objects.albums.get_tracks(album_id,
+                                                          self._genre_id,
+                                                          sql))
+            self._tracks[album_id] = tracks
+        return tracks
@@ -12,13 +12,18 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import GLib, GObject, Gst, GstPbutils
+from gi.repository import GLib, GObject, Gst
 import random
 from os import path
+from _thread import start_new_thread, allocate_lock
+from queue import Queue
 
 from lollypop.define import Objects, Navigation, NextContext
 from lollypop.define import Shuffle
 from lollypop.utils import translate_artist_name
+from lollypop.tagreader import TagReader
+from lollypop.shuffler import Shuffler
+from lollypop.playbackorder import PlaybackOrder
 
 
 class GstPlayFlags:
@@ -55,6 +60,9 @@ class PlayContext:
 class Player(GObject.GObject):
 
     EPSILON = 0.001
+    # Bytes of next track read at stream start, so it opens without delay
+    # on slow mounts
+    PREROLL_SIZE = 262144
 
     __gsignals__ = {
         'current-changed': (GObject.SignalFlags.RUN_FIRST, None, ()),
@@ -75,6 +83,8 @@ class Player(GObject.GObject):
         self.context = PlayContext()
         # Albums in current playlist
         self._albums = None
+        # Tracks of albums in current playlist
+        self._order = PlaybackOrder()
         # Used by shuffle albums to restore playlist before shuffle
         self._albums_backup = None
         # A user playlist used as current playlist
@@ -84,17 +94,24 @@ class Player(GObject.GObject):
         self._shuffle = Objects.settings.get_enum('shuffle')
         # Tracks already played
         self._shuffle_prev_tracks = []
-        # Albums already played
-        self._shuffle_albums_backup = []
-        # Tracks already played for current album
-        self._shuffle_history = {}
+        # Random tracks not already played
+        self._shuffler = Shuffler()
         # Party mode
         self._is_party = False
         # Current queue
         self._queue = []
+        # Next track (record, file exists), fetched on stream start
+        self._next_track = None
+        # Guards next track, a preroll result is kept only if generation
+        # did not change since it was requested
+        self._preroll_lock = allocate_lock()
+        self._preroll_generation = 0
+        # Prerolls requests (generation, track id) for preroll thread
+        self._preroll_queue = Queue()
+        start_new_thread(self._preroll_thread, ())
 
         self._playbin = Gst.ElementFactory.make('playbin', 'player')
-        self._tagreader = GstPbutils.Discoverer.new(10*Gst.SECOND)
+        self._tagreader = TagReader()
         flags = self._playbin.get_property("flags")
         flags &= ~GstPlayFlags.GST_PLAY_FLAG_VIDEO
         self._playbin.set_property("flags", flags)
@@ -116,12 +133,7 @@ class Player(GObject.GObject):
         @return GstPbutils.DiscovererInfo
     """
     def get_infos(self, path):
-        try:
-            uri = GLib.filename_to_uri(path)
-            infos = self._tagreader.discover_uri(uri)
-            return infos
-        except:
-            return None
+        return self._tagreader.get_infos(path)
 
     """
         True if player is playing
@@ -188,9 +200,9 @@ class Player(GObject.GObject):
         self._stop()
         self.context = PlayContext()
         self._albums = []
+        self._order.set_order([])
         self._shuffle_prev_tracks = []
-        self._shuffle_history = {}
-        self._shuffle_albums_backup = []
+        self._shuffler.clear()
 
     """
         Set PLAYING if PAUSED
@@ -217,23 +229,12 @@ class Player(GObject.GObject):
             except:
                 track_id = None
         elif self.context.position is not None:
-            tracks = Objects.albums.get_tracks(self.current.album_id,
-                                               self.current.genre_id)
-            if self.context.position <= 0:  # Prev album
-                pos = self._albums.index(self.current.album_id)
-                if pos - 1 < 0:  # we are on last album, go to first
-                    pos = len(self._albums) - 1
-                else:
-                    pos -= 1
-                self.current.album_id = self._albums[pos]
-                tracks = Objects.albums.get_tracks(self.current.album_id,
-                                                   self.current.genre_id)
-                self.context.album_id = self.current.album_id
-                self.context.position = len(tracks) - 1
-                track_id = tracks[self.context.position]
-            else:
-                self.context.position -= 1
-                track_id = tracks[self.context.position]
+            track = self._order.get_prev(self.context.album_id,
+                                         self.context.position)
+            if track is not None:
+                (self.context.album_id,
+                 self.context.position,
+                 track_id) = track
 
         if track_id:
             self.load(track_id)
@@ -244,8 +245,11 @@ class Player(GObject.GObject):
         Else => get next track in currents albums
         if force is True (default), don't wait for end of stream
         a fresh sqlite cursor should be pass as sql if we are in a thread
+        if skip is True, user skipped current track
     """
-    def next(self, force=True, sql=None):
+    def next(self, force=True, sql=None, skip=False):
+        if skip and self.current.path is not None:
+            Objects.playstats.add_skip(self.current.path)
         # Look first at user queue
         if self._queue:
             track_id = self._queue[0]
@@ -269,26 +273,14 @@ class Player(GObject.GObject):
              self._is_party:
             self._shuffle_next(force, sql)
         elif self.context.position is not None:
-            track_id = None
-            tracks = Objects.albums.get_tracks(self.context.album_id,
-                                               self.context.genre_id,
-                                               sql)
-            if self.context.position + 1 >= len(tracks):  # next album
-                pos = self._albums.index(self.context.album_id)
-                # we are on last album, go to first
-                if pos + 1 >= len(self._albums):
-                    pos = 0
-                else:
-                    pos += 1
-                self.context.album_id = self._albums[pos]
-                self.context.position = 0
-                track_id = Objects.albums.get_tracks(self._albums[pos],
-                                                     self.context.genre_id,
-                                                     sql)[0]
-            else:
-                self.context.position += 1
-                track_id = tracks[self.context.position]
-
+            track = self._order.get_next(self.context.album_id,
+                                         self.context.position,
+                                         sql)
+            if track is None:
+                return
+            (self.context.album_id,
+             self.context.position,
+             track_id) = track
             if force:
                 self.load(track_id)
             else:
@@ -345,8 +337,7 @@ class Player(GObject.GObject):
     """
     def set_party(self, party):
         self._shuffle_prev_tracks = []
-        self._shuffle_history = {}
-        self._shuffle_albums_backup = []
+        self._shuffler.clear()
         self._user_playlist = None
         if party:
             self.context.next = NextContext.STOP_NONE
@@ -361,9 +352,14 @@ class Player(GObject.GObject):
                 self._albums = Objects.albums.get_party_ids(party_ids)
             else:
                 self._albums = Objects.albums.get_ids()
+            if Objects.settings.get_value('party-weighted'):
+                self._shuffler.set_albums(self._albums,
+                                          Objects.albums.get_popularities())
+            else:
+                self._shuffler.set_albums(self._albums)
             # Start a new song if not playing
             if not self.is_playing() and self._albums:
-                track_id = self._get_random()
+                track_id = self._shuffler.next(self.current.genre_id)
                 self.load(track_id)
         else:
             # We need to put some context, take first available genre
@@ -385,10 +381,12 @@ class Player(GObject.GObject):
     """
     def set_album(self, album_id):
         self._albums = [album_id]
+        self._shuffler.set_albums(self._albums)
+        self._order.set_albums(self._albums, None)
         self.context.album_id = album_id
         self.context.genre_id = None
-        tracks = Objects.albums.get_tracks(album_id, None)
-        self.context.position = tracks.index(self.current.id)
+        self.context.position = self._order.get_position(album_id,
+                                                         self.current.id)
 
     """
         Set album list (for next/prev)
@@ -403,8 +401,7 @@ class Player(GObject.GObject):
             return
         self._albums = []
         self._shuffle_prev_tracks = []
-        self._shuffle_history = {}
-        self._shuffle_albums_backup = []
+        self._shuffler.clear()
         self.context.genre_id = genre_id
 
         # When shuffle from artist is active, we want only artist's albums,
@@ -433,9 +430,10 @@ class Player(GObject.GObject):
             self._albums += Objects.albums.get_ids(None, genre_id)
 
         self.context.album_id = album_id
-        tracks = Objects.albums.get_tracks(album_id, genre_id)
-        self.context.position = tracks.index(track_id)
+        self._order.set_albums(self._albums, genre_id)
+        self.context.position = self._order.get_position(album_id, track_id)
         self.context.genre_id = genre_id
+        self._shuffler.set_albums(self._albums)
         # Shuffle album list if needed
         self._shuffle_playlist()
 
@@ -523,10 +521,28 @@ class Player(GObject.GObject):
     def set_user_playlist(self, tracks, track_id):
         self._user_playlist = tracks
         self._albums = None
+        self._order.set_order([])
         self.context.album_id = None
         self.context.position = self._user_playlist.index(track_id)
         self._shuffle_playlist()
 
+    """
+        Reload albums tracks, collection changed, and preroll next track
+    """
+    def update_tracks(self):
+        self._order.clear_tracks()
+        self._shuffler.clear_tracks()
+        self._take_next_track()
+        if self.context.album_id is not None:
+            try:
+                self.context.position = self._order.get_position(
+                                                    self.context.album_id,
+                                                    self.current.id)
+            # Current track removed, keep its position
+            except ValueError:
+                pass
+        self._prefetch_next()
+
 #######################
 # PRIVATE             #
 #######################
@@ -537,16 +553,6 @@ class Player(GObject.GObject):
     def _stop(self):
         self._playbin.set_state(Gst.State.NULL)
 
-    """
-        Add a track to shuffle history
-        @param track id as int
-        @param album id as int
-    """
-    def _add_to_shuffle_history(self, track_id, album_id):
-        if self.current.album_id not in self._shuffle_history.keys():
-            self._shuffle_history[self.current.album_id] = []
-        self._shuffle_history[self.current.album_id].append(self.current.id)
-
     """
         Shuffle/Un-shuffle playlist based on shuffle setting
     """
@@ -562,6 +568,7 @@ class Player(GObject.GObject):
             if self._albums:
                 self._albums_backup = list(self._albums)
                 random.shuffle(self._albums)
+                self._order.set_order(self._albums)
         elif self._shuffle in [Shuffle.TRACKS, Shuffle.TRACKS_ARTIST]:
             # Shuffle user playlist
             if self._user_playlist:
@@ -572,8 +579,7 @@ class Player(GObject.GObject):
                 self.context.position = 0
             # Shuffle Tracks, just add current to history
             elif self.current.id:
-                self._add_to_shuffle_history(self.current.id,
-                                             self.current.album_id)
+                self._shuffler.add_history(self.current.id)
 
         # Unshuffle
         elif self._shuffle == Shuffle.NONE:
@@ -585,6 +591,7 @@ class Player(GObject.GObject):
             elif self._albums_backup:
                 self._albums = self._albums_backup
                 self._albums_backup = None
+                self._order.set_order(self._albums)
           
 
     """
@@ -593,8 +600,7 @@ class Player(GObject.GObject):
     """
     def _set_shuffle(self, settings, value):
         self._shuffle = Objects.settings.get_enum('shuffle')
-        self._shuffle_albums_backup = []
-        self._shuffle_history = {}
+        self._shuffler.clear()
         self._shuffle_prev_tracks = []
 
         if self._shuffle in [Shuffle.TRACKS, Shuffle.TRACKS_ARTIST] or\
@@ -659,15 +665,15 @@ class Player(GObject.GObject):
         @param bool, sqlite cursor
     """
     def _shuffle_next(self, force=False, sql=None):
-        track_id = self._get_random(sql)
+        track_id = self._shuffler.next(self.current.genre_id, sql)
         # Need to clear history
-        if not track_id:
-            self._albums = self._shuffle_albums_backup
+        if track_id is None:
             self._shuffle_prev_tracks = []
-            self._shuffle_history = {}
-            self._shuffle_albums_backup = []
-            self._shuffle_next(force)
-            return
+            self._shuffler.reset()
+            track_id = self._shuffler.next(self.current.genre_id, sql)
+            # No tracks
+            if track_id is None:
+                return
 
         if force:
             self.load(track_id)
@@ -675,29 +681,85 @@ class Player(GObject.GObject):
             self._load_track(track_id, sql)
 
     """
-        Return a random track and make sure it has never been played
-        @param sqlite cursor as sql if running in a thread
-    """
-    def _get_random(self, sql=None):
-        for album_id in sorted(self._albums,
-                               key=lambda *args: random.random()):
-            tracks = Objects.albums.get_tracks(album_id,
-                                               self.current.genre_id,
-                                               sql)
-            for track in sorted(tracks, key=lambda *args: random.random()):
-                if album_id not in self._shuffle_history.keys() or\
-                   track not in self._shuffle_history[album_id]:
-                    return track
-            # No new tracks for this album, remove it
-            # If albums not in shuffle history, it's not present
-            # in db anymore (update since shuffle set)
-            if album_id in self._shuffle_history.keys():
-                self._shuffle_history.pop(album_id)
-                self._shuffle_albums_backup.append(album_id)
-            self._albums.remove(album_id)
-
+        Get track next() will play, random track is picked now
+        @return track id as int, None if unknown
+    """
+    def _get_next_id(self):
+        if self._queue:
+            return self._queue[0]
+        elif self._user_playlist:
+            position = self.context.position + 1
+            if position >= len(self._user_playlist):
+                position = 0
+            return self._user_playlist[position]
+        elif self._shuffle in [Shuffle.TRACKS, Shuffle.TRACKS_ARTIST] or\
+                self._is_party:
+            return self._shuffler.peek(self.current.genre_id)
+        elif self.context.position is not None:
+            track = self._order.get_next(self.context.album_id,
+                                         self.context.position)
+            if track is not None:
+                return track[2]
         return None
 
+    """
+        Prepare next track in preroll thread, so loading it at end of
+        stream does not query db nor wait for disk
+    """
+    def _prefetch_next(self):
+        with self._preroll_lock:
+            self._preroll_generation += 1
+            self._next_track = None
+            generation = self._preroll_generation
+        try:
+            track_id = self._get_next_id()
+            if track_id is not None:
+                self._preroll_queue.put((generation, track_id))
+        except Exception as e:
+            print("Player::_prefetch_next(): %s" % e)
+
+    """
+        Take prerolled track, running preroll is discarded
+        @return (record, file exists), None if no track
+        @thread safe
+    """
+    def _take_next_track(self):
+        with self._preroll_lock:
+            self._preroll_generation += 1
+            next_track = self._next_track
+            self._next_track = None
+        return next_track
+
+    """
+        Preroll requested tracks, one cursor for player lifetime
+    """
+    def _preroll_thread(self):
+        while True:
+            (generation, track_id) = self._preroll_queue.get()
+            # Skip outdated requests
+            if generation != self._preroll_generation:
+                continue
+            try:
+                self._preroll(generation, track_id, Objects.db.get_cursor())
+            except Exception as e:
+                print("Player::_preroll_thread(): %s" % e)
+
+    """
+        Fetch track record, check file exists and read its first bytes
+        @param generation as int
+        @param track id as int
+        @param sql as sqlite cursor
+    """
+    def _preroll(self, generation, track_id, sql):
+        record = Objects.tracks.get_record(track_id, sql)
+        exists = path.exists(record.path)
+        if exists:
+            with open(record.path, 'rb') as f:
+                f.read(self.PREROLL_SIZE)
+        with self._preroll_lock:
+            if generation == self._preroll_generation:
+                self._next_track = (record, exists)
+
     """
         On stream start
         Emit "current-changed" to notify others components
@@ -707,8 +769,8 @@ class Player(GObject.GObject):
         # Add track to shuffle history if needed
         if self._shuffle != Shuffle.NONE or self._is_party:
             self._shuffle_prev_tracks.append(self.current.id)
-            self._add_to_shuffle_history(self.current.id,
-                                         self.current.album_id)
+            self._shuffler.add_history(self.current.id)
+        self._prefetch_next()
 
     """
         On error, next()
@@ -730,16 +792,14 @@ class Player(GObject.GObject):
     """
     def _on_stream_about_to_finish(self, obj):
         self._previous_track_id = self.current.id
-        # We are in a thread, we need to create a new cursor
-        sql = Objects.db.get_cursor()
-        self.next(False, sql)
-        # Add populariy if we listen to the song
-        album_id = Objects.tracks.get_album_id(self._previous_track_id, sql)
-        try:
-            Objects.albums.set_more_popular(album_id, sql)
-        except:
-            pass
-        sql.close()
+        album_id = self.current.album_id
+        filepath = self.current.path
+        # We are in a thread, use its cursor
+        with Objects.db.get_cursor() as sql:
+            self.next(False, sql)
+        # Add populariy if we listen to the song, written later
+        Objects.playstats.add_play(filepath, album_id)
+        self._shuffler.add_popularity(album_id)
 
     """
         Load track
@@ -752,51 +812,39 @@ class Player(GObject.GObject):
             GLib.idle_add(self.stop)
             return False
 
+        # Use prefetched track if any
+        next_track = self._take_next_track()
+        if next_track is not None and next_track[0].id == track_id:
+            (record, exists) = next_track
+        else:
+            record = Objects.tracks.get_record(track_id, sql)
+            exists = path.exists(record.path)
+
         # Stop if album changed
-        new_album_id = Objects.tracks.get_album_id(
-                                                track_id,
-                                                sql)
         if self.context.next == NextContext.STOP_ALBUM and\
-           self.current.album_id != new_album_id:
+           self.current.album_id != record.album_id:
             GLib.idle_add(self.stop)
             return False
 
         # Stop if aartist changed
-        new_aartist_id = Objects.tracks.get_aartist_id(
-                                                track_id,
-                                                sql)
         if self.context.next == NextContext.STOP_ARTIST and\
-           self.current.aartist_id != new_aartist_id:
+           self.current.aartist_id != record.aartist_id:
             GLib.idle_add(self.stop)
             return False
 
         self.current.id = track_id
-        self.current.title = Objects.tracks.get_name(
-                                                self.current.id,
-                                                sql)
-        self.current.album_id = new_album_id
-        self.current.album = Objects.albums.get_name(
-                                                self.current.album_id,
-                                                sql)
-        self.current.aartist_id = new_aartist_id
-        self.current.aartist = translate_artist_name(
-                                        Objects.artists.get_name(
-                                                self.current.aartist_id,
-                                                sql))
-        artist_name = ""
-        for artist_id in Objects.tracks.get_artist_ids(self.current.id,
-                                                       sql):
-            artist_name += translate_artist_name(
-                            Objects.artists.get_name(artist_id, sql)) + ", "
-        self.current.artist = artist_name[:-2]
-
-        self.current.genre = Objects.albums.get_genre_name(
-                                                self.current.album_id,
-                                                sql)
-        self.current.duration = Objects.tracks.get_length(self.current.id, sql)
-        self.current.number = Objects.tracks.get_number(self.current.id, sql)
-        self.current.path = Objects.tracks.get_path(self.current.id, sql)
-        if path.exists(self.current.path):
+        self.current.title = record.name
+        self.current.album_id = record.album_id
+        self.current.album = record.album_name
+        self.current.aartist_id = record.aartist_id
+        self.current.aartist = translate_artist_name(record.aartist_name)
+        self.current.artist = ", ".join([translate_artist_name(name)
+                                         for name in record.artist_names])
+        self.current.genre = record.genre_name
+        self.current.duration = record.length
+        self.current.number = record.number
+        self.current.path = record.path
+        if exists:
             try:
                 self._playbin.set_property('uri',
                                            GLib.filename_to_uri(
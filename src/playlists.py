@@ -633,8 +633,9 @@ class PlaylistEditWidget:
         Append tracks, thread safe
     """
     def _append_tracks(self):
-        sql = Objects.db.get_cursor()
-        tracks = Objects.playlists.get_tracks_id(self._playlist_name, sql)
+        with Objects.db.get_cursor() as sql:
+            tracks = Objects.playlists.get_tracks_id(self._playlist_name,
+                                                     sql)
         GLib.idle_add(self._append_track, tracks)
 
     """
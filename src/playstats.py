@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib
+from _thread import start_new_thread, allocate_lock
+from time import time
+
+from lollypop.define import Objects
+
+
+# Record plays and skips without touching db
+# Events are written in one transaction by a thread every FLUSH_INTERVAL
+# seconds, call flush() before closing db
+# Safe to use from any thread
+class PlayStats:
+    # Seconds between first pending event and write
+    FLUSH_INTERVAL = 30
+
+    def __init__(self):
+        # Events not written: (filepath, album id, played as bool, time)
+        self._pending = []
+        self._lock = allocate_lock()
+        # Held by flush(), one on quit waits for running writer
+        self._write_lock = allocate_lock()
+        self._timeout_id = None
+
+    """
+        Track played until its end, album popularity is incremented
+        @param filepath as str
+        @param album id as int
+    """
+    def add_play(self, filepath, album_id):
+        self._add((filepath, album_id, True, int(time())))
+
+    """
+        Track skipped by user
+        @param filepath as str
+    """
+    def add_skip(self, filepath):
+        self._add((filepath, None, False, None))
+
+    """
+        Write pending events now
+        @param sqlite cursor as sql if running in a thread
+    """
+    def flush(self, sql=None):
+        if not sql:
+            sql = Objects.sql
+        # Wait for running writer even with nothing pending, so db is
+        # not closed under it on quit
+        with self._write_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = []
+            if not pending:
+                return
+            # Filepath to [plays, skips, last played]
+            stats = {}
+            # Album id to plays
+            popularities = {}
+            for (filepath, album_id, played, last) in pending:
+                stat = stats.setdefault(filepath, [0, 0, None])
+                if played:
+                    stat[0] += 1
+                    stat[2] = last
+                    popularities[album_id] = popularities.get(album_id,
+                                                              0) + 1
+                else:
+                    stat[1] += 1
+            try:
+                Objects.tracks.add_stats([(filepath,) + tuple(stat)
+                                          for (filepath, stat)
+                                          in stats.items()], sql)
+                Objects.albums.add_popularities(popularities.items(), sql)
+                sql.commit()
+            except Exception as e:
+                print("PlayStats::flush(): %s" % e)
+                sql.rollback()
+                # Retry on next flush
+                with self._lock:
+                    self._pending = pending + self._pending
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Queue event and schedule a write
+        @param event as (filepath, album id, played as bool, time)
+    """
+    def _add(self, event):
+        with self._lock:
+            self._pending.append(event)
+            if self._timeout_id is None:
+                self._timeout_id = GLib.timeout_add_seconds(
+                                                        self.FLUSH_INTERVAL,
+                                                        self._on_timeout)
+
+    """
+        Write pending events in a thread
+    """
+    def _on_timeout(self):
+        with self._lock:
+            self._timeout_id = None
+        start_new_thread(self._flush_thread, ())
+        return False
+
+    """
+        Write pending events with thread cursor
+    """
+    def _flush_thread(self):
+        self.flush(Objects.db.get_cursor())
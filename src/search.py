@@ -13,9 +13,10 @@
 
 from gi.repository import Gtk, GLib
 from gettext import gettext as _
-from _thread import start_new_thread
+from _thread import start_new_thread, allocate_lock
+from queue import Queue
 
-from lollypop.define import Objects, ArtSize, Navigation
+from lollypop.define import Objects, ArtSize
 from lollypop.utils import translate_artist_name
 
 
@@ -130,6 +131,95 @@ class SearchObject:
 ######################################################################
 
 
+# Run searches in a thread, a new search cancels the running one
+class SearchExecutor:
+
+    # Sqlite virtual machine instructions between cancel checks
+    PROGRESS_STEPS = 1000
+
+    """
+        @param callback as function(results as DatabaseSearch::get())
+               called in main loop for last search only
+    """
+    def __init__(self, callback):
+        self._callback = callback
+        self._generation = 0
+        self._sql = None
+        self._lock = allocate_lock()
+        # Searches (string, generation) for search thread
+        self._queue = Queue()
+        start_new_thread(self._search_thread, ())
+
+    """
+        Search string, cancel running search
+        @param string as str
+    """
+    def search(self, string):
+        self.cancel()
+        self._queue.put((string, self._generation))
+
+    """
+        Cancel running search, its results will not be delivered
+    """
+    def cancel(self):
+        self._generation += 1
+        with self._lock:
+            if self._sql is not None:
+                self._sql.interrupt()
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Run queued searches, one cursor for executor lifetime
+    """
+    def _search_thread(self):
+        sql = None
+        while True:
+            (string, generation) = self._queue.get()
+            # Skip outdated searches
+            if generation != self._generation:
+                continue
+            if sql is None:
+                sql = Objects.db.get_cursor()
+            self._search(string, generation, sql)
+
+    """
+        Search string in db, stop as soon as generation is outdated
+        @param string as str
+        @param generation as int
+        @param sql as sqlite cursor
+    """
+    def _search(self, string, generation, sql):
+        sql.set_progress_handler(lambda: generation != self._generation,
+                                 self.PROGRESS_STEPS)
+        with self._lock:
+            if generation == self._generation:
+                self._sql = sql
+        try:
+            results = Objects.search.get(string, sql)
+            GLib.idle_add(self._deliver, results, generation)
+        except Exception as e:
+            if generation == self._generation:
+                print("SearchExecutor::_search(): %s" % e)
+        with self._lock:
+            if self._sql == sql:
+                self._sql = None
+        sql.set_progress_handler(None, 0)
+
+    """
+        Give results to callback if search is still current
+        @param results as DatabaseSearch::get()
+        @param generation as int
+    """
+    def _deliver(self, results, generation):
+        if generation == self._generation:
+            self._callback(results)
+
+######################################################################
+######################################################################
+
+
 # Show a list of search row
 class SearchWidget(Gtk.Popover):
 
@@ -140,8 +230,7 @@ class SearchWidget(Gtk.Popover):
     def __init__(self, parent):
         Gtk.Popover.__init__(self)
         self._parent = parent
-        self._in_thread = False
-        self._stop_thread = False
+        self._executor = SearchExecutor(self._on_search_finished)
         self._timeout = None
 
         grid = Gtk.Grid()
@@ -195,12 +284,13 @@ class SearchWidget(Gtk.Popover):
         self._text_entry.grab_focus()
 
     """
-        Remove row not existing in view, thread safe
+        Remove rows not existing in results
+        @param results as [SearchObject]
     """
     def _clear(self, results):
         for child in self._view.get_children():
-            if not results or not child.exists(results):
-                GLib.idle_add(child.destroy)
+            if not child.exists(results):
+                child.destroy()
 
     """
         Return True if item exist in rows
@@ -223,121 +313,62 @@ class SearchWidget(Gtk.Popover):
         Timeout filtering, call _really_do_filterting() after a small timeout
     """
     def _do_filtering(self, data=None):
-        if self._in_thread:
-            self._stop_thread = True
-            GLib.timeout_add(100, self._do_filtering)
-
         if self._timeout:
                 GLib.source_remove(self._timeout)
                 self._timeout = None
 
         if self._text_entry.get_text() != "":
-            self._timeout = GLib.timeout_add(100, self._do_filtering_thread)
+            self._timeout = GLib.timeout_add(100, self._really_do_filtering)
         else:
+            self._executor.cancel()
             self._clear([])
 
     """
-        Just run _really_do_filtering in a thread
+        Search db for text entry current text,
+        cancel previous search if still running
     """
-    def _do_filtering_thread(self):
+    def _really_do_filtering(self):
         self._timeout = None
-        self._in_thread = True
-        start_new_thread(self._really_do_filtering, ())
+        self._executor.search(self._text_entry.get_text())
 
     """
-        Populate treeview searching items
-        in db based on text entry current text
+        Populate view with search results
+        @param results as DatabaseSearch::get()
     """
-    def _really_do_filtering(self):
-        sql = Objects.db.get_cursor()
-        results = []
-        albums = []
-
-        searched = self._text_entry.get_text()
-
-        tracks_non_aartist = []
-
-        # Get all albums for all artists and non aartist tracks
-        for artist_id in Objects.artists.search(searched, sql):
-            for album_id in Objects.albums.get_ids(artist_id, None, sql):
-                if (album_id, artist_id) not in albums:
-                    albums.append((album_id, artist_id))
-            for track_id, track_name in Objects.tracks.get_as_non_aartist(
-                                                                   artist_id,
-                                                                   sql):
-                tracks_non_aartist.append((track_id, track_name))
-
-        albums += Objects.albums.search(searched, sql)
-
-        for album_id, artist_id in albums:
+    def _on_search_finished(self, results):
+        items = []
+        for (is_track, object_id, album_id,
+             title, artists, count) in results:
             search_obj = SearchObject()
-            search_obj.artist = Objects.artists.get_name(artist_id, sql)
-            search_obj.title = Objects.albums.get_name(album_id, sql)
-            search_obj.count = Objects.albums.get_count(album_id, None, sql)
-            search_obj.id = album_id
+            search_obj.artist = ", ".join([translate_artist_name(artist)
+                                           for artist in artists])
+            search_obj.title = title
+            search_obj.count = count
+            search_obj.id = object_id
             search_obj.album_id = album_id
-            results.append(search_obj)
+            search_obj.is_track = is_track
+            items.append(search_obj)
+        self._clear(items)
+        self._add_rows(items)
 
-        for track_id, track_name in Objects.tracks.search(searched, sql) +\
-                tracks_non_aartist:
-            search_obj = SearchObject()
-            search_obj.title = track_name
-            search_obj.id = track_id
-            search_obj.album_id = Objects.tracks.get_album_id(track_id, sql)
-            search_obj.is_track = True
-
-            album_artist_id = Objects.albums.get_artist_id(search_obj.album_id,
-                                                           sql)
-            artist_name = ""
-            if album_artist_id != Navigation.COMPILATIONS:
-                artist_name = Objects.albums.get_artist_name(
-                                            search_obj.album_id,
-                                            sql) + ", "
-            for artist_id in Objects.tracks.get_artist_ids(track_id, sql):
-                if artist_id != album_artist_id:
-                    artist_name += translate_artist_name(
-                                    Objects.artists.get_name(artist_id,
-                                                             sql)) + ", "
-
-            search_obj.artist = artist_name[:-2]
-
-            results.append(search_obj)
-
-        if not self._stop_thread:
-            self._clear(results)
-            GLib.idle_add(self._add_rows, results)
-        else:
-            self._in_thread = False
-            self._stop_thread = False
-
-        sql.close()
-
-    """
-        Add a rows recursively
-        @param results as array of SearchObject
-    """
-    def _add_rows(self, results):
-        if len(results) > 0:
-            result = results.pop(0)
-            if not self._exists(result):
-                search_row = SearchRow(self._parent)
-                search_row.set_artist(result.artist)
-                if result.count != -1:
-                    result.title += " (%s)" % result.count
-                search_row.set_title(result.title)
-                search_row.set_cover(Objects.art.get(result.album_id,
-                                                     ArtSize.MEDIUM))
-                search_row.id = result.id
-                search_row.is_track = result.is_track
-                self._view.add(search_row)
-            if self._stop_thread:
-                self._in_thread = False
-                self._stop_thread = False
-            else:
-                GLib.idle_add(self._add_rows, results)
-        else:
-            self._in_thread = False
-            self._stop_thread = False
+    """
+        Add rows for items not already in view
+        @param items as [SearchObject]
+    """
+    def _add_rows(self, items):
+        for item in items:
+            if self._exists(item):
+                continue
+            search_row = SearchRow(self._parent)
+            search_row.set_artist(item.artist)
+            if item.count != -1:
+                item.title += " (%s)" % item.count
+            search_row.set_title(item.title)
+            search_row.set_cover(Objects.art.get(item.album_id,
+                                                 ArtSize.MEDIUM))
+            search_row.id = item.id
+            search_row.is_track = item.is_track
+            self._view.add(search_row)
 
     """
         Play searched item when selected
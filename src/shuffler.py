@@ -0,0 +1,311 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import random
+from collections import deque
+from _thread import allocate_lock
+
+from lollypop.define import Objects
+
+
+# Sums of integer weights, a binary indexed tree
+# Weights can be changed and a position found from a cumulated weight
+# in O(log n)
+class WeightTree:
+    """
+        @param weights as [int]
+    """
+    def __init__(self, weights):
+        self._weights = list(weights)
+        self._total = sum(self._weights)
+        # Node i holds sum of weights (i - lowest bit of i, i]
+        self._tree = [0] + self._weights
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    """
+        Get weight at position
+        @param position as int
+        @return int
+    """
+    def get(self, position):
+        return self._weights[position]
+
+    """
+        Set weight at position
+        @param position as int
+        @param weight as int
+    """
+    def set(self, position, weight):
+        delta = weight - self._weights[position]
+        self._weights[position] = weight
+        self._total += delta
+        i = position + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    """
+        Get sum of all weights
+        @return int
+    """
+    def get_total(self):
+        return self._total
+
+    """
+        Find position where cumulated weights exceed value
+        @param value as int, 0 <= value < get_total()
+        @return position as int
+    """
+    def find(self, value):
+        position = 0
+        step = 1
+        while step * 2 < len(self._tree):
+            step *= 2
+        while step:
+            if position + step < len(self._tree) and\
+               self._tree[position + step] <= value:
+                position += step
+                value -= self._tree[position]
+            step //= 2
+        return position
+
+######################################################################
+######################################################################
+
+
+# Pick random tracks from albums, a track is not picked again
+# until all tracks were played
+# A random album is picked, then a random track from this album
+# Albums are picked uniformly or weighted by popularity
+# Safe to use from any thread
+class Shuffler:
+    # Weighted albums picked in last RECENT_COUNT picks
+    # have their weight divided by RECENT_DIVISOR
+    RECENT_COUNT = 20
+    RECENT_DIVISOR = 10
+
+    def __init__(self):
+        # peek() runs in main loop, next() in playback thread
+        self._lock = allocate_lock()
+        # Played track ids
+        self._played = set()
+        self._set_albums([], None)
+
+    """
+        Set albums to pick tracks from, played tracks are kept
+        @param album ids as [int]
+        @param popularities as {album id as int: popularity as int},
+               None to pick albums uniformly
+    """
+    def set_albums(self, album_ids, popularities=None):
+        with self._lock:
+            self._set_albums(album_ids, popularities)
+
+    """
+        Get a random track not played yet, O(1) except on first pick
+        from an album, O(log n) if weighted
+        @param genre id as int, only tracks from genre
+        @param sqlite cursor as sql if running in a thread
+        @return track id as int, None if all tracks were played
+    """
+    def next(self, genre_id, sql=None):
+        with self._lock:
+            return self._next(genre_id, sql)
+
+    """
+        Get track next() will return
+        @param genre id as int, only tracks from genre
+        @param sqlite cursor as sql if running in a thread
+        @return track id as int, None if all tracks were played
+    """
+    def peek(self, genre_id, sql=None):
+        with self._lock:
+            if self._peeked is None:
+                self._peeked = self._next(genre_id, sql)
+            return self._peeked
+
+    """
+        Mark track as played, it will not be picked by next()
+        @param track id as int
+    """
+    def add_history(self, track_id):
+        with self._lock:
+            self._played.add(track_id)
+
+    """
+        Increment album popularity, only used if weighted
+        @param album id as int
+    """
+    def add_popularity(self, album_id):
+        with self._lock:
+            if self._popularities is not None:
+                self._popularities[album_id] = self._popularities.get(
+                                                              album_id, 0) + 1
+                self._update_weight(album_id)
+
+    """
+        Forget loaded tracks and peeked one, collection changed
+        Played tracks are kept
+    """
+    def clear_tracks(self):
+        with self._lock:
+            self._tracks = {}
+            self._peeked = None
+
+    """
+        Forget played tracks, use it when next() returns None
+    """
+    def reset(self):
+        with self._lock:
+            self._played = set()
+            self._set_albums(self._played_albums + self._albums,
+                             self._popularities)
+
+    """
+        Forget albums and played tracks
+    """
+    def clear(self):
+        with self._lock:
+            self._played = set()
+            self._set_albums([], None)
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Set albums, see set_albums()
+        @param album ids as [int]
+        @param popularities as {album id as int: popularity as int} or None
+    """
+    def _set_albums(self, album_ids, popularities):
+        # Albums with tracks not played
+        self._albums = list(set(album_ids))
+        # Album id to position in self._albums
+        self._positions = {}
+        for position, album_id in enumerate(self._albums):
+            self._positions[album_id] = position
+        # Albums with all tracks played
+        self._played_albums = []
+        # Album id to tracks in random order, loaded on first pick,
+        # next track is last one
+        self._tracks = {}
+        self._popularities = popularities
+        # Track picked by peek(), returned by next()
+        self._peeked = None
+        # Recently picked albums, oldest first, and their count in it
+        self._recent = deque()
+        self._recent_counts = {}
+        # Weights of albums in self._albums, same positions
+        self._weights = None
+        if popularities is not None:
+            self._weights = WeightTree([self._get_weight(album_id)
+                                        for album_id in self._albums])
+
+    """
+        Get a random track, see next()
+        @param genre id as int
+        @param sqlite cursor as sql
+        @return track id as int, None if all tracks were played
+    """
+    def _next(self, genre_id, sql):
+        track_id = self._peeked
+        self._peeked = None
+        if track_id is not None and track_id not in self._played:
+            return track_id
+        while self._albums:
+            album_id = self._pick_album()
+            tracks = self._tracks.get(album_id)
+            if tracks is None:
+                tracks = Objects.albums.get_tracks(album_id, genre_id, sql)
+                # Album is not in db anymore (update since shuffle set)
+                if not tracks:
+                    self._remove(album_id)
+                    continue
+                random.shuffle(tracks)
+                self._tracks[album_id] = tracks
+            while tracks:
+                track_id = tracks.pop()
+                if track_id not in self._played:
+                    if self._weights is not None:
+                        self._add_recent(album_id)
+                    return track_id
+            # No new tracks for this album, remove it
+            self._remove(album_id)
+            self._played_albums.append(album_id)
+        return None
+
+    """
+        Pick a random album with tracks not played
+        @return album id as int
+    """
+    def _pick_album(self):
+        if self._weights is None:
+            return random.choice(self._albums)
+        value = random.randrange(self._weights.get_total())
+        return self._albums[self._weights.find(value)]
+
+    """
+        Get album weight: popularity + 1, divided if recently picked
+        @param album id as int
+        @return weight as int
+    """
+    def _get_weight(self, album_id):
+        weight = self._popularities.get(album_id, 0) + 1
+        if album_id in self._recent_counts:
+            return weight
+        return weight * self.RECENT_DIVISOR
+
+    """
+        Update album weight if album has tracks not played
+        @param album id as int
+    """
+    def _update_weight(self, album_id):
+        position = self._positions.get(album_id)
+        if position is not None:
+            self._weights.set(position, self._get_weight(album_id))
+
+    """
+        Add album to recently picked ones, forget oldest one
+        @param album id as int
+    """
+    def _add_recent(self, album_id):
+        self._recent.append(album_id)
+        self._recent_counts[album_id] = self._recent_counts.get(album_id,
+                                                                0) + 1
+        self._update_weight(album_id)
+        if len(self._recent) > self.RECENT_COUNT:
+            album_id = self._recent.popleft()
+            self._recent_counts[album_id] -= 1
+            if not self._recent_counts[album_id]:
+                del self._recent_counts[album_id]
+                self._update_weight(album_id)
+
+    """
+        Remove album from albums with tracks not played
+        @param album id as int
+    """
+    def _remove(self, album_id):
+        # Move last album to removed position
+        position = self._positions.pop(album_id)
+        last_id = self._albums.pop()
+        if self._weights is not None:
+            last = len(self._albums)
+            self._weights.set(position, self._weights.get(last))
+            self._weights.set(last, 0)
+        if last_id != album_id:
+            self._albums[position] = last_id
+            self._positions[last_id] = position
+        self._tracks.pop(album_id, None)
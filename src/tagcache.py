@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sqlite3
+from threading import local
+
+from lollypop.database import Database
+
+
+# Tags read from files, kept while file size and mtime do not change
+# Stored outside of main database, so they survive a database reset
+# Mtimes are in nanoseconds, like tracks and directories mtimes
+class TagCache:
+
+    DB_PATH = "%s/tags.db" % Database.LOCAL_PATH
+
+    create_tags = '''CREATE TABLE IF NOT EXISTS tags (
+                                filepath TEXT PRIMARY KEY,
+                                size INT NOT NULL,
+                                mtime INT NOT NULL,
+                                title TEXT,
+                                artists TEXT,
+                                aartist TEXT,
+                                album TEXT,
+                                genres TEXT,
+                                discnumber INT,
+                                tracknumber INT,
+                                year INT,
+                                length REAL,
+                                art INT NOT NULL)'''
+
+    """
+        Create cache table if needed
+    """
+    def __init__(self):
+        # Cursors by thread, used when no cursor is given
+        self._local = local()
+        sql = self._get_cursor()
+        try:
+            # Cache from older versions stored length as INT, drop it
+            result = sql.execute("PRAGMA table_info(tags)")
+            for row in result.fetchall():
+                if row[1] == "length" and row[2] != "REAL":
+                    sql.execute("DROP TABLE tags")
+            sql.execute(self.create_tags)
+            # Cache from older versions stored mtimes in seconds
+            if sql.execute("PRAGMA user_version").fetchone()[0] == 0:
+                self._upgrade_mtimes(sql)
+                sql.execute("PRAGMA user_version=1")
+            sql.commit()
+        except Exception as e:
+            print("TagCache::__init__(): %s" % e)
+
+    """
+        Get a new cursor on cache, close it when done
+        @return sqlite cursor
+    """
+    def get_cursor(self):
+        return sqlite3.connect(self.DB_PATH)
+
+    """
+        Get cached tags for file
+        @param filepath as string
+        @param size as int
+        @param mtime as int
+        @return tags as TagReader::get_tags() or None
+    """
+    def get(self, filepath, size, mtime, sql=None):
+        if not sql:
+            sql = self._get_cursor()
+        result = sql.execute("SELECT title, artists, aartist, album, genres,\
+                              discnumber, tracknumber, year, length, art\
+                              FROM tags\
+                              WHERE filepath=? AND size=? AND mtime=?",
+                             (filepath, size, mtime))
+        v = result.fetchone()
+        if v is not None:
+            return v[:-1] + (bool(v[-1]),)
+        return None
+
+    """
+        True if file has an embedded cover, None if file tags are unknown
+        @param filepath as string
+        @return bool or None
+    """
+    def has_art(self, filepath, sql=None):
+        if not sql:
+            sql = self._get_cursor()
+        try:
+            stat = os.stat(filepath)
+        except:
+            return None
+        result = sql.execute("SELECT art FROM tags\
+                              WHERE filepath=? AND size=? AND mtime=?",
+                             (filepath, stat.st_size, stat.st_mtime_ns))
+        v = result.fetchone()
+        if v is not None:
+            return bool(v[0])
+        return None
+
+    """
+        Cache tags for files
+        @param entries as [(filepath as string, size as int, mtime as int,
+                            tags as TagReader::get_tags())]
+        @warning commit needed
+    """
+    def add_many(self, entries, sql=None):
+        if not sql:
+            sql = self._get_cursor()
+        sql.executemany("INSERT OR REPLACE INTO tags\
+                         (filepath, size, mtime, title, artists, aartist,\
+                          album, genres, discnumber, tracknumber, year,\
+                          length, art)\
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(filepath, size, mtime) + tags
+                         for (filepath, size, mtime, tags) in entries])
+
+    """
+        Remove files from cache
+        @param filepaths as [string]
+        @warning commit needed
+    """
+    def remove_many(self, filepaths, sql=None):
+        if not sql:
+            sql = self._get_cursor()
+        sql.executemany("DELETE FROM tags WHERE filepath=?",
+                        [(filepath,) for filepath in filepaths])
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Get cursor for current thread, opened on first call
+        @return sqlite cursor
+    """
+    def _get_cursor(self):
+        sql = getattr(self._local, 'sql', None)
+        if sql is None:
+            sql = self.get_cursor()
+            self._local.sql = sql
+        return sql
+
+    """
+        Store mtimes in nanoseconds, entries of files modified since
+        they were cached are removed
+        @param sql as sqlite cursor
+        @warning commit needed
+    """
+    def _upgrade_mtimes(self, sql):
+        mtimes = []
+        removed = []
+        result = sql.execute("SELECT filepath, mtime FROM tags")
+        for (filepath, mtime) in result.fetchall():
+            try:
+                stat = os.stat(filepath)
+                if int(stat.st_mtime) == mtime:
+                    mtimes.append((stat.st_mtime_ns, filepath))
+                    continue
+            except:
+                pass
+            removed.append((filepath,))
+        sql.executemany("UPDATE tags SET mtime=? WHERE filepath=?", mtimes)
+        sql.executemany("DELETE FROM tags WHERE filepath=?", removed)
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib, Gst, GstPbutils
+
+
+# Read tags from files, one instance per thread
+class TagReader:
+
+    """
+        Init a synchronous discoverer
+    """
+    def __init__(self):
+        self._discoverer = GstPbutils.Discoverer.new(10*Gst.SECOND)
+
+    """
+        Return informations on file at path
+        @param path as str
+        @return GstPbutils.DiscovererInfo
+    """
+    def get_infos(self, path):
+        try:
+            uri = GLib.filename_to_uri(path)
+            infos = self._discoverer.discover_uri(uri)
+            return infos
+        except:
+            return None
+
+    """
+        Return tags for informations, missing tags are None
+        @param infos as GstPbutils.DiscovererInfo
+        @return (title as string, artists as string,
+                 album artist as string, album as string,
+                 genres as string, discnumber as int, tracknumber as int,
+                 year as int, length as int, art as bool)
+    """
+    def get_tags(self, infos):
+        tags = infos.get_tags()
+
+        (exist, title) = tags.get_string_index('title', 0)
+        if not exist:
+            title = None
+
+        artists = []
+        for i in range(0, tags.get_tag_size('artist')):
+            (exist, artist) = tags.get_string_index('artist', i)
+            artists.append(artist)
+
+        (exist, aartist) = tags.get_string_index('album-artist', 0)
+        if not exist:
+            aartist = None
+
+        (exist, album) = tags.get_string_index('album', 0)
+        if not exist:
+            album = None
+
+        genres = []
+        for i in range(0, tags.get_tag_size('genre')):
+            (exist, genre) = tags.get_string_index('genre', i)
+            genres.append(genre)
+
+        (exist, discnumber) = tags.get_uint_index('disc-number', 0)
+        if not exist:
+            discnumber = None
+
+        (exist, tracknumber) = tags.get_uint_index('track-number', 0)
+        if not exist:
+            tracknumber = None
+
+        (exist, datetime) = tags.get_date_time('datetime')
+        if exist:
+            year = datetime.get_year()
+        else:
+            year = None
+
+        length = infos.get_duration()/1000000000
+
+        (art, sample) = tags.get_sample_index('image', 0)
+
+        return (title, ";".join(artists) or None, aartist, album,
+                ";".join(genres) or None, discnumber, tracknumber, year,
+                length, art)
@@ -272,7 +272,7 @@ class Toolbar:
         @param button as Gtk.Button
     """
     def _on_next_btn_clicked(self, button):
-        Objects.player.next()
+        Objects.player.next(skip=True)
 
     """
         Show search widget on search button clicked
@@ -11,16 +11,35 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import unicodedata
 from gi.repository import Gio
 from gettext import gettext as _
 
+# Well known file extensions, lower case without dot
+AUDIO_EXTENSIONS = set(['aac', 'aif', 'aifc', 'aiff', 'ape', 'au', 'flac',
+                        'm4a', 'm4b', 'mka', 'mp2', 'mp3', 'mpc', 'oga',
+                        'ogg', 'opus', 'ra', 'spx', 'tta', 'wav', 'wma',
+                        'wv'])
+OTHER_EXTENSIONS = set(['bmp', 'cue', 'db', 'gif', 'htm', 'html', 'ini',
+                        'jpeg', 'jpg', 'log', 'm3u', 'm3u8', 'md5', 'nfo',
+                        'pdf', 'pls', 'png', 'sfv', 'tif', 'tiff', 'txt',
+                        'webp', 'xspf'])
+
 """
     Return True if files is audio
     @param f as Gio.File
+    @param by_extension as bool, only sniff content for unknown extensions
 """
 
 
-def is_audio(f):
+def is_audio(f, by_extension=False):
+    if by_extension:
+        extension = os.path.splitext(f.get_basename())[1][1:].lower()
+        if extension in AUDIO_EXTENSIONS:
+            return True
+        elif extension in OTHER_EXTENSIONS:
+            return False
     try:
         info = f.query_info('standard::content-type',
                             Gio.FileQueryInfoFlags.NONE)
@@ -60,6 +79,19 @@ def translate_artist_name(name):
     return name
 
 
+"""
+    Return name as searched: compatibility decomposed,
+    case folded and without diacritics
+    @param name as str
+    @return str
+"""
+
+
+def normalize_name(name):
+    name = unicodedata.normalize('NFKD', name).casefold()
+    return "".join([c for c in name if not unicodedata.combining(c)])
+
+
 """
     Convert seconds to a pretty string
     @param seconds as int
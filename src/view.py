@@ -183,16 +183,20 @@ class ArtistView(View):
         @param navigation id as int
     """
     def populate(self, navigation_id):
-        sql = Objects.db.get_cursor()
-        if self._artist_id == Navigation.COMPILATIONS:
-            albums = Objects.albums.get_compilations(navigation_id,
+        with Objects.db.get_cursor() as sql:
+            if self._artist_id == Navigation.COMPILATIONS:
+                albums = Objects.albums.get_compilations(navigation_id,
+                                                         sql)
+            else:
+                albums = Objects.albums.get_ids(self._artist_id,
+                                                navigation_id,
+                                                sql)
+            records = Objects.albums.get_records(albums, sql)
+            tracks = Objects.albums.get_tracks_infos(albums,
+                                                     navigation_id,
                                                      sql)
-        else:
-            albums = Objects.albums.get_ids(self._artist_id,
-                                            navigation_id,
-                                            sql)
-        GLib.idle_add(self._add_albums, albums, navigation_id)
-        sql.close()
+        GLib.idle_add(self._add_albums, albums, records, tracks,
+                      navigation_id)
 
     """
         Stop populating
@@ -226,23 +230,28 @@ class ArtistView(View):
         Pop an album and add it to the view,
         repeat operation until album list is empty
         @param [album ids as int]
+        @param records as {album id as int: AlbumRecord}
+        @param tracks as {album id as int: [track infos]},
+               see DatabaseAlbums::get_tracks_infos()
         @param genre id as int
     """
-    def _add_albums(self, albums, genre_id):
+    def _add_albums(self, albums, records, tracks, genre_id):
         size_group = Gtk.SizeGroup(mode=Gtk.SizeGroupMode.HORIZONTAL)
         if len(albums) > 0 and not self._stop:
-            widget = AlbumDetailedWidget(albums.pop(0),
+            album_id = albums.pop(0)
+            widget = AlbumDetailedWidget(album_id,
                                          genre_id,
                                          self._show_menu,
-                                         size_group)
+                                         size_group,
+                                         records.get(album_id))
             widget.show()
-            start_new_thread(widget.populate, ())
+            widget.populate(tracks.get(album_id, []))
             self._albumbox.add(widget)
             if widget.eventbox:
                 window = widget.eventbox.get_window()
                 if window:
                     window.set_cursor(Gdk.Cursor(Gdk.CursorType.HAND1))
-            GLib.idle_add(self._add_albums, albums,
+            GLib.idle_add(self._add_albums, albums, records, tracks,
                           genre_id, priority=GLib.PRIORITY_LOW)
         else:
             self._stop = False
@@ -293,16 +302,20 @@ class AlbumView(View):
         Populate albums, thread safe
     """
     def populate(self):
-        sql = Objects.db.get_cursor()
-        if self._navigation_id == Navigation.ALL:
-            albums = Objects.albums.get_ids(None, None, sql)
-        elif self._navigation_id == Navigation.POPULARS:
-            albums = Objects.albums.get_populars(sql)
-        else:
-            albums = Objects.albums.get_compilations(self._navigation_id, sql)
-            albums += Objects.albums.get_ids(None, self._navigation_id, sql)
-        GLib.idle_add(self._add_albums, albums)
-        sql.close()
+        with Objects.db.get_cursor() as sql:
+            if self._navigation_id == Navigation.ALL:
+                albums = Objects.albums.get_ids(None, None, sql)
+            elif self._navigation_id == Navigation.POPULARS:
+                albums = Objects.albums.get_populars(sql)
+            else:
+                albums = Objects.albums.get_compilations(
+                                                        self._navigation_id,
+                                                        sql)
+                albums += Objects.albums.get_ids(None,
+                                                 self._navigation_id,
+                                                 sql)
+            records = Objects.albums.get_records(albums, sql)
+        GLib.idle_add(self._add_albums, albums, records)
 
 #######################
 # PRIVATE             #
@@ -380,13 +393,16 @@ class AlbumView(View):
         Pop an album and add it to the view,
         repeat operation until album list is empty
         @param [album ids as int]
+        @param records as {album id as int: AlbumRecord}
     """
-    def _add_albums(self, albums):
+    def _add_albums(self, albums, records):
         if len(albums) > 0 and not self._stop:
-            widget = AlbumWidget(albums.pop(0))
+            album_id = albums.pop(0)
+            widget = AlbumWidget(album_id, records.get(album_id))
             widget.show()
             self._albumbox.insert(widget, -1)
-            GLib.idle_add(self._add_albums, albums, priority=GLib.PRIORITY_LOW)
+            GLib.idle_add(self._add_albums, albums, records,
+                          priority=GLib.PRIORITY_LOW)
         else:
             self._stop = False
 
@@ -429,8 +445,9 @@ class PlaylistView(View):
         Thread safe
     """
     def populate(self):
-        sql = Objects.db.get_cursor()
-        tracks = Objects.playlists.get_tracks_id(self._playlist_name, sql)
+        with Objects.db.get_cursor() as sql:
+            tracks = Objects.playlists.get_tracks_id(self._playlist_name,
+                                                     sql)
         mid_tracks = int(0.5+len(tracks)/2)
         self._playlist_widget.populate_list_one(tracks[:mid_tracks],
                                                 1)
@@ -30,10 +30,14 @@ class AlbumWidget(Gtk.Grid):
             - Album cover
             - Album name
             - Artist name
+        @param album id as int
+        @param record as AlbumRecord, read from db if None
     """
-    def __init__(self, album_id):
+    def __init__(self, album_id, record=None):
         Gtk.Grid.__init__(self)
         self._album_id = album_id
+        if record is None:
+            record = Objects.albums.get_record(album_id)
 
         self.set_property("margin", 5)
 
@@ -42,13 +46,12 @@ class AlbumWidget(Gtk.Grid):
         self._ui.add_from_resource('/org/gnome/Lollypop/AlbumWidget.ui')
 
         self._cover = self._ui.get_object('cover')
-        self._cover.set_from_pixbuf(Objects.art.get(album_id, ArtSize.BIG))
+        self._cover.set_from_pixbuf(Objects.art.get(album_id, ArtSize.BIG,
+                                                    record))
 
-        album_name = Objects.albums.get_name(album_id)
         title = self._ui.get_object('title')
-        title.set_label(album_name)
-        artist_name = Objects.albums.get_artist_name(album_id)
-        artist_name = translate_artist_name(artist_name)
+        title.set_label(record.name)
+        artist_name = translate_artist_name(record.artist_name)
         artist = self._ui.get_object('artist')
         artist.set_label(artist_name)
 
@@ -89,16 +92,20 @@ class AlbumDetailedWidget(Gtk.Grid):
         @param parent width as int
         @param show_menu as bool if menu need to be displayed
         @param size group as Gtk.SizeGroup
+        @param record as AlbumRecord, read from db if None
     """
-    def __init__(self, album_id, genre_id, show_menu, size_group):
+    def __init__(self, album_id, genre_id, show_menu, size_group,
+                 record=None):
         Gtk.Grid.__init__(self)
         self._stop = False
+        if record is None:
+            record = Objects.albums.get_record(album_id)
 
         self._ui = Gtk.Builder()
         self._ui.add_from_resource(
                     '/org/gnome/Lollypop/AlbumDetailedWidget.ui')
 
-        self._artist_id = Objects.albums.get_artist_id(album_id)
+        self._artist_id = record.artist_id
         self._album_id = album_id
         self._genre_id = genre_id
 
@@ -119,11 +126,10 @@ class AlbumDetailedWidget(Gtk.Grid):
         self._tracks_widget2.show()
 
         self._cover = self._ui.get_object('cover')
-        self._cover.set_from_pixbuf(Objects.art.get(album_id, ArtSize.BIG))
-        self._ui.get_object('title').set_label(
-                                            Objects.albums.get_name(album_id))
-        self._ui.get_object('year').set_label(
-                                            Objects.albums.get_year(album_id))
+        self._cover.set_from_pixbuf(Objects.art.get(album_id, ArtSize.BIG,
+                                                    record))
+        self._ui.get_object('title').set_label(record.name)
+        self._ui.get_object('year').set_label(record.year)
         self.add(self._ui.get_object('AlbumDetailedWidget'))
 
         if show_menu:
@@ -161,17 +167,19 @@ class AlbumDetailedWidget(Gtk.Grid):
         return self._album_id
 
     """
-        Populate tracks
+        Populate tracks, thread safe
+        @param tracks as [track infos], see DatabaseAlbums::get_tracks_infos()
+               if None, tracks are read from db
     """
-    def populate(self):
+    def populate(self, tracks=None):
         self._stop = False
-        sql = Objects.db.get_cursor()
-        mid_tracks = int(0.5+Objects.albums.get_count(self._album_id,
-                                                      self._genre_id,
-                                                      sql)/2)
-        tracks = Objects.albums.get_tracks_infos(self._album_id,
-                                                 self._genre_id,
-                                                 sql)
+        if tracks is None:
+            with Objects.db.get_cursor() as sql:
+                tracks = Objects.albums.get_tracks_infos([self._album_id],
+                                                         self._genre_id,
+                                                         sql)
+            tracks = tracks.get(self._album_id, [])
+        mid_tracks = int(0.5+len(tracks)/2)
         self.populate_list_one(tracks[:mid_tracks],
                                1)
         self.populate_list_two(tracks[mid_tracks:],
@@ -219,7 +227,8 @@ class AlbumDetailedWidget(Gtk.Grid):
 
     """
         Add tracks for to tracks widget
-        @param tracks as [(track_id, title, length, [artist ids])]
+        @param tracks as [(track_id, title, length, [artist ids],
+                           [artist names])]
         @param widget as TracksWidget
         @param i as int
     """
@@ -238,9 +247,8 @@ class AlbumDetailedWidget(Gtk.Grid):
            len(artist_ids) > 1 or\
            self._artist_id not in artist_ids:
             artist_name = ""
-            for artist_id in artist_ids:
-                artist_name += translate_artist_name(
-                                Objects.artists.get_name(artist_id)) + ", "
+            for name in track[4]:
+                artist_name += translate_artist_name(name) + ", "
             title = "<b>%s</b>\n%s" % (escape(artist_name[:-2]),
                                        title)
 
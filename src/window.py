@@ -92,7 +92,7 @@ class Window(Gtk.ApplicationWindow, Container):
         elif 'Stop' in response:
             Objects.player.stop()
         elif 'Next' in response:
-            Objects.player.next()
+            Objects.player.next(skip=True)
         elif 'Previous' in response:
             Objects.player.prev()
 
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmark hot database lookups with and without schema indexes
+# A synthetic collection is written to a new database, lookups are timed
+# with DatabaseUpgrade.INDEXES, then again after dropping them.
+# Run it with lollypop modules in python path:
+# PYTHONPATH=/usr/lib/python3/site-packages python3 tests/bench_db_queries.py
+
+import os
+import tempfile
+from time import perf_counter
+from gi.repository import GLib
+
+from lollypop.define import Objects
+from lollypop.database import Database
+from lollypop.database_albums import DatabaseAlbums
+from lollypop.database_tracks import DatabaseTracks
+
+# Collection size
+TRACKS = 50000
+ALBUMS = 5000
+ARTISTS = 3000
+GENRES = 50
+# Calls timed for each lookup
+CALLS = 200
+
+
+# Settings for a new database
+class Settings:
+    def get_value(self, key):
+        return GLib.Variant('i', 0)
+
+    def set_value(self, key, value):
+        pass
+
+
+"""
+    Write synthetic collection
+    @param sql as sqlite cursor
+"""
+
+
+def populate(sql):
+    sql.executemany("INSERT INTO artists (rowid, name) VALUES (?, ?)",
+                    [(i, "Artist %s" % i) for i in range(1, ARTISTS + 1)])
+    sql.executemany("INSERT INTO genres (rowid, name) VALUES (?, ?)",
+                    [(i, "Genre %s" % i) for i in range(1, GENRES + 1)])
+    sql.executemany("INSERT INTO albums (rowid, name, artist_id, year,\
+                                         path, popularity)\
+                     VALUES (?, ?, ?, 2000, ?, 0)",
+                    [(i, "Album %s" % i, i % ARTISTS + 1, "/music/%s" % i)
+                     for i in range(1, ALBUMS + 1)])
+    sql.executemany("INSERT INTO album_genres (album_id, genre_id)\
+                     VALUES (?, ?)",
+                    [(i, i % GENRES + 1) for i in range(1, ALBUMS + 1)])
+    sql.executemany("INSERT INTO tracks (rowid, name, filepath, length,\
+                                         tracknumber, discnumber, album_id,\
+                                         year, mtime)\
+                     VALUES (?, ?, ?, 180, ?, 1, ?, 2000, 0)",
+                    [(i, "Track %s" % i, get_path(i), i // ALBUMS,
+                      i % ALBUMS + 1) for i in range(1, TRACKS + 1)])
+    sql.executemany("INSERT INTO track_artists (track_id, artist_id)\
+                     VALUES (?, ?)",
+                    [(i, (i % ALBUMS) % ARTISTS + 1)
+                     for i in range(1, TRACKS + 1)])
+    sql.executemany("INSERT INTO track_genres (track_id, genre_id)\
+                     VALUES (?, ?)",
+                    [(i, (i % ALBUMS) % GENRES + 1)
+                     for i in range(1, TRACKS + 1)])
+    sql.commit()
+
+
+"""
+    Return path of synthetic track
+    @param track id as int
+    @return str
+"""
+
+
+def get_path(track_id):
+    return "/music/%s/%s.ogg" % (track_id % ALBUMS + 1, track_id)
+
+
+"""
+    Return mean duration of calls in ms
+    @param function called with call number
+    @param calls as int
+    @return float
+"""
+
+
+def timeit(function, calls):
+    start = perf_counter()
+    for i in range(calls):
+        function(i)
+    return (perf_counter() - start) / calls * 1000
+
+
+"""
+    Time lookups
+    @param sql as sqlite cursor
+    @return (get_id_by_path, get_tracks, get_ids) durations in ms
+"""
+
+
+def bench(sql):
+    return (timeit(lambda i: Objects.tracks.get_id_by_path(
+                                             get_path(i * 7 % TRACKS + 1),
+                                             sql), CALLS),
+            timeit(lambda i: Objects.albums.get_tracks(i * 13 % ALBUMS + 1,
+                                                       None, sql), CALLS),
+            timeit(lambda i: Objects.albums.get_ids(None, i % GENRES + 1,
+                                                    sql), CALLS // 10))
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp()
+    Database.LOCAL_PATH = path
+    Database.DB_PATH = os.path.join(path, "lollypop.db")
+    Objects.settings = Settings()
+    Objects.db = Database()
+    Objects.sql = Objects.db.get_cursor()
+    Objects.albums = DatabaseAlbums()
+    Objects.tracks = DatabaseTracks()
+    sql = Objects.sql
+    populate(sql)
+    indexed = bench(sql)
+    result = sql.execute("SELECT name FROM sqlite_master\
+                          WHERE type='index' AND name LIKE 'idx_%'")
+    for (name,) in result.fetchall():
+        sql.execute("DROP INDEX %s" % name)
+    sql.commit()
+    plain = bench(sql)
+    print("%s tracks, mean per call, without -> with indexes" % TRACKS)
+    for (name, before, after) in zip(["get_id_by_path",
+                                      "get_tracks",
+                                      "get_ids(genre)"], plain, indexed):
+        print("  %-16s %8.3fms -> %.3fms" % (name, before, after))
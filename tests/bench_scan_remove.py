@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmark a full collection scan after 20% of files were deleted
+# A synthetic collection is written to disk and to a new database with
+# files mtimes, so scans only walk and remove deleted tracks.
+# Fails if tracks are missing or orphaned entries are left.
+# Run it with lollypop modules in python path:
+# PYTHONPATH=/usr/lib/python3/site-packages python3 tests/bench_scan_remove.py
+
+import os
+import sys
+import random
+import tempfile
+from time import perf_counter
+from gi.repository import GLib
+
+from lollypop.define import Objects
+from lollypop.database import Database
+from lollypop.database_albums import DatabaseAlbums
+from lollypop.database_artists import DatabaseArtists
+from lollypop.database_genres import DatabaseGenres
+from lollypop.database_tracks import DatabaseTracks
+from lollypop.database_search import DatabaseSearch
+from lollypop.tagcache import TagCache
+from lollypop.collectionscanner import CollectionScanner
+
+# Collection size
+ALBUMS = 2000
+TRACKS = 10
+ARTISTS = 700
+GENRES = 20
+# Part of files deleted
+REMOVED = 0.2
+
+
+# Settings for a new database and collection path
+class Settings:
+    def __init__(self, path):
+        self._values = {'db-version': GLib.Variant('i', 0),
+                        'music-path': GLib.Variant('as', [path]),
+                        'audio-by-extension': GLib.Variant('b', True),
+                        'scan-workers': GLib.Variant('i', 1)}
+
+    def get_value(self, key):
+        return self._values[key]
+
+    def set_value(self, key, value):
+        self._values[key] = value
+
+
+# Scan progress, not shown
+class Progress:
+    def show(self):
+        pass
+
+    def hide(self):
+        pass
+
+    def set_fraction(self, fraction):
+        pass
+
+
+"""
+    Write synthetic collection to disk and database
+    @param path as str
+    @param sql as sqlite cursor
+    @return files as [str]
+"""
+
+
+def populate(path, sql):
+    files = []
+    for album in range(1, ALBUMS + 1):
+        directory = os.path.join(path, "Album %s" % album)
+        os.makedirs(directory)
+        for track in range(TRACKS):
+            filepath = os.path.join(directory, "%02d.ogg" % track)
+            open(filepath, 'wb').close()
+            files.append(filepath)
+    sql.executemany("INSERT INTO artists (rowid, name) VALUES (?, ?)",
+                    [(i, "Artist %s" % i) for i in range(1, ARTISTS + 1)])
+    sql.executemany("INSERT INTO genres (rowid, name) VALUES (?, ?)",
+                    [(i, "Genre %s" % i) for i in range(1, GENRES + 1)])
+    sql.executemany("INSERT INTO albums (rowid, name, artist_id, year,\
+                                         path, popularity)\
+                     VALUES (?, ?, ?, 2000, ?, 0)",
+                    [(i, "Album %s" % i, i % ARTISTS + 1,
+                      os.path.join(path, "Album %s" % i))
+                     for i in range(1, ALBUMS + 1)])
+    sql.executemany("INSERT INTO album_genres (album_id, genre_id)\
+                     VALUES (?, ?)",
+                    [(i, i % GENRES + 1) for i in range(1, ALBUMS + 1)])
+    rows = []
+    for (i, filepath) in enumerate(files, 1):
+        album = (i - 1) // TRACKS + 1
+        rows.append((i, "Track %s" % i, filepath, i % TRACKS, album,
+                     os.stat(filepath).st_mtime_ns))
+    sql.executemany("INSERT INTO tracks (rowid, name, filepath, length,\
+                                         tracknumber, discnumber, album_id,\
+                                         year, mtime)\
+                     VALUES (?, ?, ?, 180, ?, 1, ?, 2000, ?)", rows)
+    sql.executemany("INSERT INTO track_artists (track_id, artist_id)\
+                     VALUES (?, ?)",
+                    [(i, album % ARTISTS + 1)
+                     for (i, name, filepath, number, album, mtime) in rows])
+    sql.executemany("INSERT INTO track_genres (track_id, genre_id)\
+                     VALUES (?, ?)",
+                    [(i, album % GENRES + 1)
+                     for (i, name, filepath, number, album, mtime) in rows])
+    sql.commit()
+    return files
+
+
+"""
+    Run a full scan and wait for it
+    @param scanner as CollectionScanner
+    @return duration in seconds
+"""
+
+
+def scan(scanner):
+    finished = []
+    handler = scanner.connect("scan-finished",
+                              lambda scanner: finished.append(True))
+    start = perf_counter()
+    scanner.update(False, True)
+    context = GLib.MainContext.default()
+    while not finished:
+        context.iteration(True)
+    scanner.disconnect(handler)
+    return perf_counter() - start
+
+
+"""
+    Count rows in table
+    @param sql as sqlite cursor
+    @param request as str
+    @return int
+"""
+
+
+def count(sql, request):
+    return sql.execute(request).fetchone()[0]
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp()
+    collection = os.path.join(path, "music")
+    Database.LOCAL_PATH = path
+    Database.DB_PATH = os.path.join(path, "lollypop.db")
+    TagCache.DB_PATH = os.path.join(path, "tags.db")
+    Objects.settings = Settings(collection)
+    Objects.db = Database()
+    Objects.sql = Objects.db.get_cursor()
+    Objects.albums = DatabaseAlbums()
+    Objects.artists = DatabaseArtists()
+    Objects.genres = DatabaseGenres()
+    Objects.tracks = DatabaseTracks()
+    Objects.search = DatabaseSearch()
+    Objects.tagcache = TagCache()
+    sql = Objects.sql
+    files = populate(collection, sql)
+    scanner = CollectionScanner(Progress())
+    unchanged = scan(scanner)
+    random.seed(0)
+    removed = random.sample(files, int(len(files) * REMOVED))
+    for filepath in removed:
+        os.remove(filepath)
+    duration = scan(scanner)
+    tracks = count(sql, "SELECT COUNT(*) FROM tracks")
+    orphans = count(sql, "SELECT COUNT(*) FROM track_artists\
+                          WHERE track_id NOT IN (SELECT rowid FROM tracks)")
+    orphans += count(sql, "SELECT COUNT(*) FROM track_genres\
+                           WHERE track_id NOT IN (SELECT rowid FROM tracks)")
+    print("%s tracks, unchanged scan %.2fs" % (len(files), unchanged))
+    print("%s files deleted, scan %.2fs, %s tracks left, %s orphans" %
+          (len(removed), duration, tracks, orphans))
+    sys.exit(0 if tracks == len(files) - len(removed) and not orphans
+             else 1)
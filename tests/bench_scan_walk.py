@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmark audio detection while walking a collection
+# A synthetic directory tree is walked like CollectionScanner::_walk(),
+# files are detected with utils::is_audio() sniffing content type,
+# then by extension.
+# Run it with lollypop modules in python path:
+# PYTHONPATH=/usr/lib/python3/site-packages python3 tests/bench_scan_walk.py
+# or pass a directory to walk instead of the synthetic tree
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+from gi.repository import Gio
+
+from lollypop.utils import is_audio
+
+# Synthetic tree size
+ALBUMS = 1000
+TRACKS = 12
+# Audio files headers by extension
+AUDIO = {'ogg': b'OggS', 'mp3': b'ID3\x03', 'flac': b'fLaC'}
+# Other files found in albums
+OTHERS = ['cover.jpg', 'album.cue', 'rip.log', 'notes.xyz']
+# Walks timed for each mode, best one is kept
+RUNS = 3
+
+
+"""
+    Write synthetic tree
+    @param path as str
+"""
+
+
+def populate(path):
+    extensions = sorted(AUDIO.keys())
+    for album in range(ALBUMS):
+        directory = os.path.join(path, "Artist %s" % (album % 300),
+                                 "Album %s" % album)
+        os.makedirs(directory)
+        extension = extensions[album % len(extensions)]
+        for track in range(TRACKS):
+            filepath = os.path.join(directory, "%02d.%s" % (track, extension))
+            with open(filepath, 'wb') as f:
+                f.write(AUDIO[extension] + bytes(4092))
+        for name in OTHERS:
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(bytes(4096))
+
+
+"""
+    Walk path and detect audio files
+    @param path as str
+    @param by_extension as bool
+    @return (audio files count, duration in seconds)
+"""
+
+
+def walk(path, by_extension):
+    start = perf_counter()
+    count = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            f = Gio.File.new_for_path(os.path.join(root, name))
+            if is_audio(f, by_extension):
+                count += 1
+    return (count, perf_counter() - start)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = tempfile.mkdtemp()
+        populate(path)
+    results = {False: [], True: []}
+    for i in range(RUNS):
+        for by_extension in [False, True]:
+            results[by_extension].append(walk(path, by_extension))
+    (sniffed, sniffing) = min(results[False], key=lambda r: r[1])
+    (detected, extension) = min(results[True], key=lambda r: r[1])
+    print("sniffing content type: %s audio files in %.2fs" % (sniffed,
+                                                              sniffing))
+    print("by extension:          %s audio files in %.2fs" % (detected,
+                                                              extension))
+    sys.exit(0 if sniffed == detected else 1)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# Copyright (c) 2014-2015 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Concurrency stress test for Database.get_cursor()
+# A full collection scan runs while player like threads write play stats
+# and view like threads browse albums and search, each with its own
+# cursor. Tags come from a prefilled tag cache, so no file is read.
+# Fails on any sqlite error, like "database is locked", if scan does not
+# add all tracks or if reads are slower than READ_P99 or READ_MAX.
+# Run it with lollypop modules in python path:
+# PYTHONPATH=/usr/lib/python3/site-packages python3 tests/database_stress.py
+
+import os
+import sys
+import sqlite3
+import tempfile
+from threading import Thread
+from time import perf_counter, time
+from gi.repository import GLib
+
+from lollypop.define import Objects
+from lollypop.database import Database
+from lollypop.database_albums import DatabaseAlbums
+from lollypop.database_artists import DatabaseArtists
+from lollypop.database_genres import DatabaseGenres
+from lollypop.database_tracks import DatabaseTracks
+from lollypop.database_search import DatabaseSearch
+from lollypop.tagcache import TagCache
+from lollypop.collectionscanner import CollectionScanner
+
+# Collection size
+ALBUMS = 3000
+TRACKS = 10
+# Threads of each kind
+WRITERS = 2
+READERS = 3
+# Read duration limits in seconds
+READ_P99 = 0.2
+READ_MAX = 2
+# Seconds before a scan is considered stuck
+SCAN_TIMEOUT = 600
+
+
+# Settings for a new database and collection path
+class Settings:
+    def __init__(self, path):
+        self._values = {'db-version': GLib.Variant('i', 0),
+                        'music-path': GLib.Variant('as', [path]),
+                        'audio-by-extension': GLib.Variant('b', True),
+                        'scan-workers': GLib.Variant('i', 1)}
+
+    def get_value(self, key):
+        return self._values[key]
+
+    def set_value(self, key, value):
+        self._values[key] = value
+
+
+# Scan progress, not shown
+class Progress:
+    def show(self):
+        pass
+
+    def hide(self):
+        pass
+
+    def set_fraction(self, fraction):
+        pass
+
+
+# Scan collection while reading and writing from other threads,
+# collect sqlite errors and durations
+class DatabaseStress:
+
+    def __init__(self):
+        self._running = False
+        self._errors = []
+        self._reads = []
+        self._writes = []
+
+    """
+        Run stress test
+        @return True if no error and reads are fast enough
+    """
+    def run(self):
+        self._running = True
+        threads = []
+        for i in range(WRITERS):
+            threads.append(Thread(target=self._thread,
+                                  args=(self._player, i)))
+        for i in range(READERS):
+            threads.append(Thread(target=self._thread, args=(self._view,)))
+        for thread in threads:
+            thread.start()
+        start = perf_counter()
+        self._scan()
+        duration = perf_counter() - start
+        self._running = False
+        for thread in threads:
+            thread.join()
+        tracks = Objects.sql.execute("SELECT COUNT(*) FROM tracks")
+        if tracks.fetchone()[0] != ALBUMS * TRACKS:
+            self._errors.append("scan did not add all tracks")
+        if not self._reads or not self._writes:
+            print("Scan finished before any read or write")
+            return False
+        self._reads.sort()
+        self._writes.sort()
+        p99 = self._reads[int(len(self._reads) * 0.99)]
+        print("scan of %s tracks %.1fs" % (ALBUMS * TRACKS, duration))
+        print("%s reads: p50 %.1fms, p99 %.1fms, max %.1fms" %
+              (len(self._reads),
+               self._reads[len(self._reads) // 2] * 1000,
+               p99 * 1000, self._reads[-1] * 1000))
+        print("%s writes: max %.1fms" % (len(self._writes),
+                                         self._writes[-1] * 1000))
+        for error in sorted(set(self._errors)):
+            print("%s: %s" % (error, self._errors.count(error)))
+        return not self._errors and p99 <= READ_P99 and\
+            self._reads[-1] <= READ_MAX
+
+#######################
+# PRIVATE             #
+#######################
+    """
+        Run full scan and wait for it, at most SCAN_TIMEOUT seconds
+    """
+    def _scan(self):
+        finished = []
+        scanner = CollectionScanner(Progress())
+        scanner.connect("scan-finished",
+                        lambda scanner: finished.append(True))
+        timeout = GLib.timeout_add_seconds(SCAN_TIMEOUT, self._on_timeout,
+                                           finished)
+        scanner.update(False, True)
+        context = GLib.MainContext.default()
+        while not finished:
+            context.iteration(True)
+        GLib.source_remove(timeout)
+
+    """
+        Stop waiting for scan
+        @param finished as [bool]
+    """
+    def _on_timeout(self, finished):
+        self._errors.append("scan timed out")
+        finished.append(True)
+        return True
+
+    """
+        Run function, errors opening cursor are collected too
+        @param function
+        @param args
+    """
+    def _thread(self, function, *args):
+        try:
+            function(*args)
+        except sqlite3.Error as e:
+            self._errors.append(str(e))
+
+    """
+        Add play stats one by one, like PlayStats
+        @param thread number as int
+    """
+    def _player(self, number):
+        sql = Objects.db.get_cursor()
+        count = 0
+        while self._running:
+            stats = [("/music/%s/%s" % (number, count % 100), 1, 0,
+                      int(time()))]
+            count += 1
+            start = perf_counter()
+            try:
+                with sql:
+                    Objects.tracks.add_stats(stats, sql)
+                self._writes.append(perf_counter() - start)
+            except sqlite3.Error as e:
+                self._errors.append(str(e))
+
+    """
+        Browse albums and search, like views
+    """
+    def _view(self):
+        sql = Objects.db.get_cursor()
+        while self._running:
+            start = perf_counter()
+            try:
+                album_ids = Objects.albums.get_ids(None, None, sql)[:50]
+                Objects.albums.get_records(album_ids, sql)
+                Objects.albums.get_tracks_infos(album_ids[:5], None, sql)
+                Objects.search.get("song 3", sql)
+                self._reads.append(perf_counter() - start)
+            except sqlite3.Error as e:
+                self._errors.append(str(e))
+
+
+"""
+    Write synthetic collection files and their tags to tag cache
+    @param path as str
+"""
+
+
+def populate(path):
+    entries = []
+    for album in range(ALBUMS):
+        directory = os.path.join(path, "Album %s" % album)
+        os.makedirs(directory)
+        for track in range(TRACKS):
+            filepath = os.path.join(directory, "%02d.ogg" % track)
+            open(filepath, 'wb').close()
+            tags = ("Song %s" % track, "Artist %s" % (album % 700),
+                    "Artist %s" % (album % 700), "Album %s" % album,
+                    "Genre %s" % (album % 20), 1, track + 1, 2000,
+                    180.0, False)
+            entries.append((filepath, 0, os.stat(filepath).st_mtime_ns,
+                            tags))
+    sql = Objects.tagcache.get_cursor()
+    Objects.tagcache.add_many(entries, sql)
+    sql.commit()
+    sql.close()
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp()
+    collection = os.path.join(path, "music")
+    Database.LOCAL_PATH = path
+    Database.DB_PATH = os.path.join(path, "lollypop.db")
+    TagCache.DB_PATH = os.path.join(path, "tags.db")
+    Objects.settings = Settings(collection)
+    Objects.db = Database()
+    Objects.sql = Objects.db.get_cursor()
+    Objects.albums = DatabaseAlbums()
+    Objects.artists = DatabaseArtists()
+    Objects.genres = DatabaseGenres()
+    Objects.tracks = DatabaseTracks()
+    Objects.search = DatabaseSearch()
+    Objects.tagcache = TagCache()
+    populate(collection)
+    sys.exit(0 if DatabaseStress().run() else 1)